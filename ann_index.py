@@ -0,0 +1,228 @@
+import argparse
+import json
+import math
+import os
+import time
+
+import faiss
+import numpy as np
+
+from normalization import NORMALIZATION_VERSION
+
+# === Settings ===
+# Embeddings are L2-normalized, so inner product is cosine similarity.
+# "flat-l2" is the exact L2 index of generations built before index types existed.
+INDEX_TYPES = ("flat-ip", "hnsw", "ivf-pq")
+INDEX_TYPE = os.getenv("INDEX_TYPE", "auto")  # auto | flat-ip | hnsw | ivf-pq
+INDEX_META_FILE = "index_meta.json"
+VECTORS_FILE = "vectors.npy"
+
+FLAT_MAX_ROWS = int(os.getenv("FLAT_MAX_ROWS", "50000"))      # exact search up to here
+HNSW_MAX_ROWS = int(os.getenv("HNSW_MAX_ROWS", "2000000"))    # HNSW up to here, IVF-PQ beyond
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+PQ_BITS = 8
+
+LEGACY_META = {"type": "flat-l2", "metric": "l2", "params": {}, "normalization": 1}
+
+# Index types whose ids can be removed in place, so incremental rebuilds can
+# patch the previous index instead of building a new one.
+SUPPORTS_REMOVE = {"flat-l2", "flat-ip", "ivf-pq"}
+
+
+def choose_index_type(n_rows, requested=INDEX_TYPE):
+    if requested != "auto":
+        if requested not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {requested}. Choose auto or one of {', '.join(INDEX_TYPES)}")
+        return requested
+    if n_rows <= FLAT_MAX_ROWS:
+        return "flat-ip"
+    if n_rows <= HNSW_MAX_ROWS:
+        return "hnsw"
+    return "ivf-pq"
+
+
+def default_params(index_type, n_rows, dim):
+    if index_type == "hnsw":
+        return {"M": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION, "ef_search": HNSW_EF_SEARCH}
+    if index_type == "ivf-pq":
+        # ~4*sqrt(n) lists with at least 39 training points each (FAISS's k-means
+        # minimum), and 8-dim sub-quantizers
+        nlist = max(1, min(int(4 * math.sqrt(n_rows)), n_rows // 39))
+        m = max(d for d in range(1, dim // 8 + 1) if dim % d == 0)
+        nbits = PQ_BITS if n_rows >= 39 * 2 ** PQ_BITS else max(1, int(math.log2(max(n_rows // 39, 2))))
+        return {"nlist": nlist, "m": m, "nbits": nbits, "nprobe": IVF_NPROBE}
+    return {}
+
+
+# === Build ===
+# Flat and HNSW sit behind an IndexIDMap2 for arbitrary row ids. IVF-PQ keeps
+# ids natively (IndexIDMap's remove_ids assumes the sub-index compacts in order,
+# which IVF does not).
+def build_index(index_type, vectors, ids, params):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ids = np.asarray(ids, dtype=np.int64)
+    dim = vectors.shape[1]
+
+    if index_type == "flat-ip":
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+    elif index_type == "flat-l2":
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+    elif index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, params["M"], faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = params["ef_construction"]
+        index = faiss.IndexIDMap2(base)
+    elif index_type == "ivf-pq":
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, params["nlist"], params["m"], params["nbits"],
+                                 faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    if len(ids):
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def index_meta(index_type, params, dim, rows):
+    return {
+        "type": index_type,
+        "metric": "l2" if index_type == "flat-l2" else "inner_product",
+        "dim": int(dim),
+        "rows": int(rows),
+        "params": params,
+        "normalization": NORMALIZATION_VERSION,
+    }
+
+
+def write_index_meta(path, meta):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def read_index_meta(path):
+    if not os.path.exists(path):
+        return dict(LEGACY_META)
+    with open(path, encoding="utf-8") as f:
+        meta = json.load(f)
+    meta.setdefault("normalization", 1)  # written before the version was recorded
+    return meta
+
+
+# === Search ===
+# Search-time knobs (efSearch / nprobe) come from the stored params; sel is an
+# optional FAISS IDSelector restricting the search to candidate ids.
+def search_parameters(meta, sel=None, k=0):
+    params = meta.get("params", {})
+    if meta["type"] == "hnsw":
+        search_params = faiss.SearchParametersHNSW()
+        search_params.efSearch = max(params.get("ef_search", HNSW_EF_SEARCH), k)
+    elif meta["type"] == "ivf-pq":
+        search_params = faiss.SearchParametersIVF()
+        search_params.nprobe = params.get("nprobe", IVF_NPROBE)
+    elif sel is not None:
+        search_params = faiss.SearchParameters()
+    else:
+        return None
+
+    if sel is not None:
+        search_params.sel = sel
+    return search_params
+
+
+# === Recall vs latency report ===
+# Every index type is built from the same stored vectors and compared with the
+# exact inner-product result. Queries are catalog vectors with a little noise,
+# so the report needs no encoder.
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100.0 * len(ordered)) - 1))]
+
+
+def recall_latency_report(vectors, k=10, n_queries=200, seed=0, sweeps=None):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_rows, dim = vectors.shape
+    ids = np.arange(n_rows, dtype=np.int64)
+    k = min(k, n_rows)
+
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(n_rows, size=min(n_queries, n_rows), replace=False)]
+    queries = queries + rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact = build_index("flat-ip", vectors, ids, {})
+    _, truth = exact.search(queries, k)
+
+    sweeps = sweeps or {
+        "flat-ip": [{}],
+        "hnsw": [{"ef_search": ef} for ef in (16, 32, 64, 128)],
+        "ivf-pq": [{"nprobe": nprobe} for nprobe in (1, 4, 16, 64)],
+    }
+
+    rows = []
+    for index_type, settings in sweeps.items():
+        params = default_params(index_type, n_rows, dim)
+        start = time.perf_counter()
+        index = build_index(index_type, vectors, ids, params)
+        build_seconds = time.perf_counter() - start
+
+        for setting in settings:
+            meta = index_meta(index_type, dict(params, **setting), dim, n_rows)
+            search_params = search_parameters(meta, k=k)
+            latencies, recalls = [], []
+            for q, expected in zip(queries, truth):
+                start = time.perf_counter()
+                _, found = index.search(q[None, :], k, params=search_params)
+                latencies.append((time.perf_counter() - start) * 1000.0)
+                recalls.append(len(set(found[0].tolist()) & set(expected.tolist())) / k)
+
+            rows.append({
+                "type": index_type,
+                "params": meta["params"],
+                "build_seconds": build_seconds,
+                f"recall@{k}": float(np.mean(recalls)),
+                "p50_ms": _percentile(latencies, 50),
+                "p95_ms": _percentile(latencies, 95),
+            })
+    return {"rows": n_rows, "dim": dim, "k": k, "queries": len(queries), "results": rows}
+
+
+def load_generation_vectors():
+    from artifacts import current_generation, generation_file, generation_paths
+
+    generation = current_generation()
+    if not generation:
+        raise FileNotFoundError("No published generation; run embedding.py first")
+
+    vectors_path = generation_file(generation, VECTORS_FILE)
+    if os.path.exists(vectors_path):
+        return generation, np.load(vectors_path)
+
+    # Generations built before vectors.npy existed: read them back from the flat index
+    index = faiss.read_index(generation_paths(generation)[0])
+    return generation, index.index.reconstruct_n(0, index.ntotal)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ANN index recall vs latency against exact search.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--output", default="ann_report.json")
+    args = parser.parse_args()
+
+    generation, vectors = load_generation_vectors()
+    print(f"📐 Benchmarking ANN indexes on {generation}: {vectors.shape[0]} x {vectors.shape[1]}")
+    report = recall_latency_report(vectors, k=args.k, n_queries=args.queries)
+    report["generation"] = generation
+
+    recall_key = f"recall@{report['k']}"
+    for row in report["results"]:
+        print(f"   {row['type']:>8} {json.dumps(row['params']):<60} {recall_key}={row[recall_key]:.3f}"
+              f"  p50={row['p50_ms']:.3f}ms  p95={row['p95_ms']:.3f}ms")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Report written to {args.output}")
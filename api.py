@@ -1,54 +1,300 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-from search import search
+import time
+API_IMPORT_START = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+import asyncio
+import gemini_booster
+import importlib
+import json
+import metrics
 import os
+import re
 import uvicorn
 
-app = FastAPI()
+PREWARM = os.getenv("PREWARM", "1").lower() not in ("0", "false", "no")
+NEIGHBOURS_TOP_N = int(os.getenv("NEIGHBOURS_TOP_N", "50"))  # same setting as neighbours.py, which imports numpy
+
+# === Lazy Search Module ===
+# search pulls in FAISS, the catalog and the encoder, so it is imported by the
+# prewarm task (or the first request) rather than at startup.
+_search = None
+
+def get_search():
+    global _search
+    if _search is None:
+        _search = importlib.import_module("search")
+    return _search
+
+# For async endpoints: the first import runs in a worker thread (and waits there
+# on the import lock while prewarm holds it), never on the event loop.
+async def get_search_async():
+    return _search or await asyncio.to_thread(get_search)
+
+# === Startup Lifecycle ===
+startup_state = {"ready": False, "error": None, "timings": {}}
+
+def prewarm():
+    timings = startup_state["timings"]
+
+    start = time.perf_counter()
+    search = get_search()
+    timings["import_search"] = time.perf_counter() - start
+
+    timings.update(search.prewarm())
+    timings["time_to_ready"] = time.perf_counter() - API_IMPORT_START
+    startup_state["ready"] = True
+    print(f"🔥 Prewarm complete: { {k: round(v, 3) for k, v in timings.items()} }")
+
+async def run_prewarm():
+    try:
+        await asyncio.to_thread(prewarm)
+    except Exception as e:
+        startup_state["error"] = str(e)
+        print(f"[ERROR] Prewarm failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app):
+    startup_state["timings"]["api_import"] = API_READY - API_IMPORT_START
+    # Prewarm runs in the background so the port opens (and /health answers) immediately
+    task = asyncio.create_task(run_prewarm()) if PREWARM else None
+    yield
+    if task:
+        task.cancel()
 
-# ✅ Health check endpoint
+app = FastAPI(lifespan=lifespan)
+
+# ✅ Health check endpoint (liveness)
 @app.get("/health")
 def health():
     return {"status": "healthy"}
 
+# 🚦 Readiness: index, catalog and model are loaded and warmed up
+@app.get("/ready")
+def ready():
+    status_code = 200 if startup_state["ready"] else 503
+    return JSONResponse(status_code=status_code, content={
+        "ready": startup_state["ready"],
+        "error": startup_state["error"],
+        "timings": startup_state["timings"]
+    })
+
 # ✅ Root endpoint (optional)
 @app.get("/")
 def root():
     return {"message": "FastAPI backend is running"}
 
+# 📈 Cache statistics
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "query_embeddings": get_search().query_cache.stats(),
+        "results": get_search().result_cache.stats(),
+        "llm_responses": gemini_booster.cache.stats()
+    }
+
+# 📊 Prometheus metrics: stage histograms, request/fallback/LLM counters and cache hit rates
+def _cache_stats():
+    stats = {"llm_responses": gemini_booster.cache.stats()}
+    if _search is not None:
+        stats["query_embeddings"] = _search.query_cache.stats()
+        stats["results"] = _search.result_cache.stats()
+    return stats
+
+metrics.CallbackMetric(
+    "shl_cache_lookups_total", "Cache lookups by cache and result.", "counter", ["cache", "result"],
+    lambda: [((name, result), s[key]) for name, s in _cache_stats().items()
+             for result, key in (("hit", "hits"), ("miss", "misses"))]
+)
+metrics.CallbackMetric(
+    "shl_cache_hit_ratio", "Cache hit ratio since process start.", "gauge", ["cache"],
+    lambda: [((name,), s["hit_rate"]) for name, s in _cache_stats().items()]
+)
+
+metrics.CallbackMetric(
+    "shl_process_memory_bytes", "Resident memory of this worker (rss, pss, private, shared).", "gauge", ["kind"],
+    lambda: [((kind,), value) for kind, value in metrics.process_memory().items()]
+)
+
+# Each worker process has its own counters (labelled worker="..."); behind
+# serve.py a scrape here reaches one worker at random, so scrape the
+# per-worker METRICS_PORT listeners instead.
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 class QueryRequest(BaseModel):
     query: str
+    debug: bool = False  # adds the rewritten query, per-stage timings and LLM token usage
+    include_explanations: bool = False  # used by /recommend/stream only
+    dense_weight: Optional[float] = None    # fusion weights; None uses the server defaults
+    lexical_weight: Optional[float] = None
+    reranker: Optional[Literal["gemini", "cross-encoder", "none"]] = None  # None uses RERANKER
+    gating: Optional[Literal["auto", "always", "never"]] = None  # LLM stage gating; None uses LLM_GATING
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    top_k: int = Field(10, ge=1)
+    dense_weight: Optional[float] = None
+    lexical_weight: Optional[float] = None
+
+def parse_duration(value):
+    match = re.search(r"\d+", str(value))
+    return int(match.group()) if match else 0
+
+def format_assessment(record):
+    return {
+        "assessment_id": record.get("Assessment ID"),  # for /similar/{assessment_id}
+        "url": record.get("URL", ""),
+        "adaptive_support": record.get("Adaptive Support", "No"),
+        "description": record.get("Description", ""),
+        "duration": parse_duration(record.get("Duration", 0)),
+        "remote_support": record.get("Remote Testing Support", "No"),
+        "test_type": record.get("Test Type(s)", [])
+    }
 
 @app.post("/recommend")
-def recommend_assessments(req: QueryRequest):
+async def recommend_assessments(req: QueryRequest):
+    start = time.perf_counter()
     try:
         print(f"Received query: {req.query}")
 
-        response = search(
+        search = await get_search_async()
+        response = await search.search_async(
             query=req.query,
             top_k=10,
-            debug=False,
+            debug=req.debug,
             do_rerank=True,
-            include_explanations=False
+            include_explanations=False,
+            dense_weight=req.dense_weight,
+            lexical_weight=req.lexical_weight,
+            reranker=req.reranker,
+            gating=req.gating
         )
 
-        results = []
-        for record in response.get("results", []):
-            results.append({
-                "url": record.get("URL", ""),
-                "adaptive_support": record.get("Adaptive Support", "No"),
-                "description": record.get("Description", ""),
-                "duration": int(record.get("Duration", 0)),
-                "remote_support": record.get("Remote Testing Support", "No"),
-                "test_type": record.get("Test Type(s)", [])
-            })
+        results = [format_assessment(record) for record in response.get("results", [])]
 
+        payload = {
+            "recommended_assessments": results,
+            "from_cache": response.get("from_cache", False)  # reused from a near-identical earlier query
+        }
+        if req.debug:
+            payload["debug"] = {
+                "rewritten_query": response.get("rewritten_query"),
+                "gating": response.get("gating"),
+                "timings_ms": response.get("timings_ms", {}),
+                "llm_usage": response.get("llm_usage", {})  # Gemini calls and tokens per prompt kind
+            }
+        metrics.REQUESTS.inc(endpoint="recommend", status="ok")
+        return payload
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        metrics.REQUESTS.inc(endpoint="recommend", status="error")
+        return {"status": "error", "message": str(e)}
+    finally:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint="recommend")
+
+# 🌊 Streaming variant: NDJSON, one event per line. Dense results arrive first,
+# then the rewritten / reranked orderings and each explanation as it completes.
+def stream_events(req: QueryRequest):
+    for event in get_search().search_stream(
+        query=req.query,
+        top_k=10,
+        debug=req.debug,
+        do_rerank=True,
+        include_explanations=req.include_explanations,
+        dense_weight=req.dense_weight,
+        lexical_weight=req.lexical_weight,
+        reranker=req.reranker,
+        gating=req.gating
+    ):
+        results = event.pop("results", None)
+        if results is not None:
+            event["recommended_assessments"] = [format_assessment(r) for r in results]
+        yield json.dumps(event) + "\n"
+
+@app.post("/recommend/stream")
+def recommend_stream(req: QueryRequest):
+    metrics.REQUESTS.inc(endpoint="recommend_stream", status="ok")
+    return StreamingResponse(stream_events(req), media_type="application/x-ndjson")
+
+def split_param(value):
+    return [v.strip().lower() for v in value.split(",") if v.strip()] if value else []
+
+# 🧭 Assessments similar to one catalog entry, from the neighbour table built with
+# the index. Optional filters use the same fields as the ones extracted from queries;
+# test_types are catalog codes (K, P, ...).
+@app.get("/similar/{assessment_id}")
+def similar(assessment_id: int, top_k: int = Query(10, ge=1, le=NEIGHBOURS_TOP_N), min_duration: Optional[int] = None,
+            max_duration: Optional[int] = None, job_levels: Optional[str] = None,
+            test_types: Optional[str] = None, languages: Optional[str] = None,
+            remote: bool = False, adaptive: bool = False, irt: bool = False):
+    start = time.perf_counter()
+    try:
+        from catalog_columns import TEST_TYPE_CODES  # numpy stays out of the API import path
+
+        filters = {
+            "min_duration": min_duration,
+            "max_duration": max_duration,
+            "job_levels": split_param(job_levels),
+            "test_types": [TEST_TYPE_CODES.get(code.upper(), code) for code in split_param(test_types)],
+            "languages": split_param(languages),
+            "remote": remote,
+            "adaptive": adaptive,
+            "irt": irt,
+        }
+        response = get_search().similar_assessments(assessment_id, top_k, filters)
+        if response is None:
+            metrics.REQUESTS.inc(endpoint="similar", status="not_found")
+            return JSONResponse(status_code=404, content={"status": "error",
+                                                          "message": f"Unknown assessment_id {assessment_id}"})
+
+        metrics.REQUESTS.inc(endpoint="similar", status="ok")
         return {
-            "recommended_assessments": results
+            "assessment": format_assessment(response["assessment"]),
+            "similar_assessments": [
+                dict(format_assessment(r), similarity=r["Similarity"]) for r in response["results"]
+            ]
         }
     except Exception as e:
         print(f"Error occurred: {e}")
+        metrics.REQUESTS.inc(endpoint="similar", status="error")
         return {"status": "error", "message": str(e)}
+    finally:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint="similar")
+
+@app.post("/recommend/batch")
+async def recommend_batch(req: BatchQueryRequest):
+    start = time.perf_counter()
+    try:
+        print(f"Received batch of {len(req.queries)} queries")
+
+        responses = await asyncio.to_thread(
+            (await get_search_async()).search_many, req.queries, req.top_k,
+            dense_weight=req.dense_weight, lexical_weight=req.lexical_weight
+        )
+
+        metrics.REQUESTS.inc(endpoint="recommend_batch", status="ok")
+        return {
+            "results": [
+                {
+                    "query": query,
+                    "recommended_assessments": [format_assessment(r) for r in response.get("results", [])]
+                }
+                for query, response in zip(req.queries, responses)
+            ]
+        }
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        metrics.REQUESTS.inc(endpoint="recommend_batch", status="error")
+        return {"status": "error", "message": str(e)}
+    finally:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint="recommend_batch")
+
+API_READY = time.perf_counter()
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
@@ -1,9 +1,13 @@
 import streamlit as st
 import requests
 from bs4 import BeautifulSoup
+import os
+import time
 import torch
 
-from search import search
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.components.v1 import html
 
 # Patch for PyTorch bug
 if hasattr(torch, "classes"):
@@ -12,6 +16,86 @@ if hasattr(torch, "classes"):
     except Exception:
         pass
 
+# === Settings ===
+URL_CACHE_ENTRIES = int(os.getenv("URL_CACHE_ENTRIES", "128"))
+URL_CACHE_TTL = int(os.getenv("URL_CACHE_TTL", "3600"))
+URL_TEXT_MAX_CHARS = 50000
+SEARCH_MEMO_ENTRIES = 16   # finished searches kept per browser session
+SEARCH_WORKERS = 4
+
+# === Shared resources ===
+# Streamlit re-runs this script on every widget interaction. The index, catalog
+# and encoder are loaded once per process and shared by every session.
+@st.cache_resource(show_spinner="📦 Loading index and model...")
+def load_search():
+    import search
+    search.prewarm()
+    return search
+
+@st.cache_resource
+def search_pool():
+    return ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="app-search")
+
+# Fetched pages are cached per URL (failures are not cached, so they are retried)
+@st.cache_data(max_entries=URL_CACHE_ENTRIES, ttl=URL_CACHE_TTL, show_spinner="🌐 Fetching job description...")
+def extract_text_from_url(url):
+    response = requests.get(url, timeout=5)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.text, "html.parser")
+    return soup.get_text(separator=" ", strip=True)[:URL_TEXT_MAX_CHARS]
+
+# === Background search ===
+# search_stream runs in a worker thread and appends its events to the job; the
+# script only reads them. A rerun (any widget change) therefore never restarts
+# or blocks on a search: it picks the job up again from session state.
+class SearchJob:
+    def __init__(self):
+        self.events = []
+        self.done = False
+
+    def run(self, search, options):
+        try:
+            for event in search.search_stream(**options):
+                self.events.append(event)
+        except Exception as e:
+            self.events.append({"event": "error", "message": str(e)})
+        finally:
+            self.done = True
+
+def start_search(key, options):
+    jobs = st.session_state.setdefault("search_jobs", OrderedDict())
+    job = jobs.get(key)
+    if job is None or any(e["event"] == "error" for e in job.events):
+        job = SearchJob()
+        search_pool().submit(job.run, load_search(), options)
+        jobs[key] = job
+    jobs.move_to_end(key)
+    while len(jobs) > SEARCH_MEMO_ENTRIES:
+        jobs.popitem(last=False)
+    st.session_state["active_search"] = key
+
+# Folds the events received so far into what the page shows
+def replay(events):
+    state = {"results": [], "rewritten_query": None, "fallback": None, "error": None,
+             "stage": None, "explained": 0, "done": False}
+    for event in events:
+        if event["event"] == "results":
+            state["results"] = [dict(r) for r in event["results"]]
+            state["stage"] = event["stage"]
+            state["rewritten_query"] = event["rewritten_query"]
+        elif event["event"] == "explanation":
+            state["results"][event["index"]]["LLM Explanation"] = event["explanation"]
+            state["explained"] += 1
+        elif event["event"] == "fallback":
+            state["results"] = []
+            state["fallback"] = event.get("fallback")
+        elif event["event"] == "error":
+            state["error"] = event["message"]
+            state["done"] = True
+        elif event["event"] == "done":
+            state["done"] = True
+    return state
+
 st.set_page_config(page_title="SHL Assessment Recommender", layout="centered")
 st.title("📊 SHL Assessment Recommendation Tool")
 
@@ -42,9 +126,7 @@ elif input_type == "URL":
             st.warning("⚠️ Please enter a valid URL (with http:// or https://)")
         else:
             try:
-                response = requests.get(user_url, timeout=5)
-                soup = BeautifulSoup(response.text, "html.parser")
-                user_input = soup.get_text(separator=" ", strip=True)
+                user_input = extract_text_from_url(user_url)
                 st.success("✅ Extracted text from URL!")
             except Exception as e:
                 st.error(f"❌ Failed to fetch text from URL: {e}")
@@ -53,85 +135,128 @@ elif input_type == "URL":
 st.markdown("### 🧠 Gemini AI Features")
 col1, col2 = st.columns(2)
 with col1:
-    enable_rerank = st.checkbox("🔁 Re-rank with Gemini", value=True)
+    enable_rerank = st.checkbox("🔁 Re-rank results", value=True)
+    reranker_label = st.selectbox(
+        "Re-ranker",
+        ("Gemini", "Local cross-encoder"),
+        disabled=not enable_rerank,
+        help="The local cross-encoder runs on CPU and skips the Gemini round trip."
+    )
     enable_fallback = st.checkbox("🧩 Fallback via Gemini", value=True)
 with col2:
     show_explanations = st.checkbox("💬 Show LLM Explanations", value=False)
     top_k = st.slider("🔝 Number of results", min_value=5, max_value=15, value=10)
 
-# --- Trigger Search ---
-if st.button("🔍 Recommend Assessments"):
-    if not user_input.strip():
-        st.warning("⚠️ Please enter valid input before searching.")
-    else:
-        with st.spinner("Rewriting, embedding and searching..."):
-            try:
-                search_response = search(
-                    query=user_input,
-                    top_k=top_k,
-                    debug=False,
-                    include_explanations=show_explanations,
-                    do_rerank=enable_rerank
-                )
-
-                rewritten_query = search_response.get("rewritten_query", "")
-                results = search_response.get("results", [])
-                fallback_msg = search_response.get("fallback", None)
-
-            except Exception as e:
-                st.error(f"❌ Search failed: {e}")
-                results = []
-                rewritten_query = ""
-                fallback_msg = None
+# --- Result Rendering ---
+STAGE_MESSAGES = {
+    None: "🔎 Searching...",
+    "dense": "⚡ Showing vector-search matches while Gemini refines the query...",
+    "rewritten": "📝 Updated with the rewritten query...",
+    "reranked": "🔁 Re-ranked results",
+    "cached": "♻️ Served from the result cache",
+}
+STAGE_PROGRESS = {None: 0.1, "dense": 0.4, "rewritten": 0.6, "reranked": 0.8, "cached": 1.0}
 
-        if rewritten_query:
-            st.info(f"📝 Gemini Rewritten Query:\n\n{rewritten_query}")
+def search_progress(state):
+    if state["done"]:
+        return 1.0
+    progress = STAGE_PROGRESS[state["stage"]]
+    if show_explanations and state["results"]:
+        progress += (0.95 - progress) * state["explained"] / len(state["results"])
+    return progress
 
-        if results:
-            st.success(f"🎯 Top {len(results)} relevant assessments:")
-            for idx, item in enumerate(results[:top_k], 1):
-                name = item.get('Assessment Name', 'Untitled')
-                url = item.get('URL', '#')
+def render_results(results, done):
+    st.success(f"🎯 Top {len(results)} relevant assessments:")
+    for idx, item in enumerate(results[:top_k], 1):
+        assessment_name = item.get('Assessment Name', 'Untitled')
+        assessment_url = item.get('URL', '#')
 
-                from streamlit.components.v1 import html
+        # Inline button that looks like a link
+        html(f"""
+            <div style="margin-bottom: 0.5em">
+                <a href="{assessment_url}" target="_blank" style="
+                text-decoration: none;
+                color: #1f77b4;
+                font-size: 20px;
+                font-weight: 600;
+                font-family: 'sans-serif';
+                ">{idx}. {assessment_name}</a>
+            </div>
+            """, height=30)
 
-                assessment_name = item.get('Assessment Name', 'Untitled')
-                assessment_url = item.get('URL', '#')
 
-                # Inline button that looks like a link
-                html(f"""
-                    <div style="margin-bottom: 0.5em">
-                        <a href="{assessment_url}" target="_blank" style="
-                        text-decoration: none;
-                        color: #1f77b4;
-                        font-size: 20px;
-                        font-weight: 600;
-                        font-family: 'sans-serif';
-                        ">{idx}. {assessment_name}</a>
-                    </div>
-                    """, height=30)
+        st.markdown(f"- **Job Levels**: {item.get('Job Levels', 'N/A')}")
 
+        test_type_raw = item.get('Test Type(s)', 'N/A')
+        test_type_list = [t.strip() for t in test_type_raw.split(',')]
+        unique_test_types = ', '.join(sorted(set(test_type_list)))
+        st.markdown(f"- **Test Type(s)**: {unique_test_types}")
 
-                st.markdown(f"- **Job Levels**: {item.get('Job Levels', 'N/A')}")
+        st.markdown(f"- **Remote Testing Support**: {item.get('Remote Testing Support', 'N/A')}")
+        st.markdown(f"- **Adaptive Support**: {item.get('Adaptive Support', 'N/A')}")
+        st.markdown(f"- **IRT Support**: {item.get('IRT Support', 'N/A')}")
+        st.markdown(f"- **Duration**: {item.get('Duration', 'N/A')}")
+        st.markdown(f"- **Description**:\n> {item.get('Description', '')[:1000]}...\n")
 
-                test_type_raw = item.get('Test Type(s)', 'N/A')
-                test_type_list = [t.strip() for t in test_type_raw.split(',')]
-                unique_test_types = ', '.join(sorted(set(test_type_list)))
-                st.markdown(f"- **Test Type(s)**: {unique_test_types}")
+        if show_explanations:
+            if "LLM Explanation" in item:
+                st.markdown(f"🧠 **Gemini Explanation:**\n> {item['LLM Explanation']}")
+            elif done:
+                st.caption("🧠 Run the search again to generate explanations.")
+            else:
+                st.caption("🧠 Generating explanation...")
+        st.markdown("---")
 
-                st.markdown(f"- **Remote Testing Support**: {item.get('Remote Testing Support', 'N/A')}")
-                st.markdown(f"- **Adaptive Support**: {item.get('Adaptive Support', 'N/A')}")
-                st.markdown(f"- **IRT Support**: {item.get('IRT Support', 'N/A')}")
-                st.markdown(f"- **Duration**: {item.get('Duration', 'N/A')}")
-                st.markdown(f"- **Description**:\n> {item.get('Description', '')[:1000]}...\n")
+# --- Trigger Search ---
+# Each (input, options) pair is searched once per session. Results are redrawn
+# in place as the rewrite, re-rank and explanation stages complete, and stay on
+# the page when display options change.
+reranker = "cross-encoder" if reranker_label == "Local cross-encoder" else "gemini"
+search_key = (user_input.strip(), top_k, enable_rerank, reranker, show_explanations)
 
-                if show_explanations and "LLM Explanation" in item:
-                    st.markdown(f"🧠 **Gemini Explanation:**\n> {item['LLM Explanation']}")
-                st.markdown("---")
+if st.button("🔍 Recommend Assessments"):
+    if not user_input.strip():
+        st.warning("⚠️ Please enter valid input before searching.")
+    else:
+        start_search(search_key, {
+            "query": user_input,
+            "top_k": top_k,
+            "debug": False,
+            "include_explanations": show_explanations,
+            "do_rerank": enable_rerank,
+            "reranker": reranker
+        })
 
+job = st.session_state.get("search_jobs", {}).get(st.session_state.get("active_search"))
+if job is not None:
+    progress_bar = st.empty()
+    rewritten_box = st.empty()
+    results_box = st.empty()
 
-        elif fallback_msg and enable_fallback:
-            st.warning(f"🤖 {fallback_msg}")
+    seen = -1
+    while True:
+        done = job.done  # read before the events so the last batch is never missed
+        if len(job.events) != seen:
+            seen = len(job.events)
+            state = replay(job.events[:seen])
+            if state["done"]:
+                progress_bar.empty()
+            else:
+                progress_bar.progress(search_progress(state), text=STAGE_MESSAGES[state["stage"]])
+            if state["stage"] not in (None, "dense"):
+                rewritten_box.info(f"📝 Gemini Rewritten Query:\n\n{state['rewritten_query']}")
+            if state["results"]:
+                with results_box.container():
+                    render_results(state["results"], state["done"])
+        if done:
+            break
+        time.sleep(0.1)
 
+    if state["error"]:
+        st.error(f"❌ Search failed: {state['error']}")
+    elif not state["results"]:
+        results_box.empty()
+        if state["fallback"] and enable_fallback:
+            st.warning(f"🤖 {state['fallback']}")
         else:
             st.warning("😕 No relevant assessments found. Try rephrasing or simplifying your input.")
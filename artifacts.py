@@ -0,0 +1,66 @@
+import os
+import shutil
+
+# === Layout ===
+# artifacts/
+#   CURRENT            -> name of the live generation, replaced atomically
+#   gen-<number>/      -> faiss_index.index, catalog_store/ and side indexes for one build
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", "artifacts")
+CURRENT_FILE = "CURRENT"
+INDEX_FILE = "faiss_index.index"
+CATALOG_SUBDIR = "catalog_store"
+KEEP_GENERATIONS = int(os.getenv("KEEP_GENERATIONS", "3"))
+
+
+def current_generation(root=ARTIFACTS_DIR):
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def generation_paths(generation, root=ARTIFACTS_DIR):
+    base = os.path.join(root, generation)
+    return os.path.join(base, INDEX_FILE), os.path.join(base, CATALOG_SUBDIR)
+
+
+def generation_file(generation, filename, root=ARTIFACTS_DIR):
+    return os.path.join(root, generation, filename)
+
+
+def _generations(root):
+    return sorted(d for d in os.listdir(root) if d.startswith("gen-"))
+
+
+def new_generation_dir(root=ARTIFACTS_DIR):
+    os.makedirs(root, exist_ok=True)
+    existing = _generations(root)
+    number = int(existing[-1].split("-")[1]) + 1 if existing else 1
+    name = f"gen-{number:06d}"
+    staging = os.path.join(root, f".staging-{name}")
+    os.makedirs(staging)
+    return name, staging
+
+
+# Moves a fully written staging directory into place, then flips CURRENT with
+# os.replace so readers only ever see a complete generation.
+def publish_generation(name, staging, root=ARTIFACTS_DIR):
+    os.replace(staging, os.path.join(root, name))
+
+    tmp_pointer = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, os.path.join(root, CURRENT_FILE))
+
+    _prune_generations(root, keep=name)
+
+
+# Old generations stay readable by processes that still have them mapped
+# (unlinked files remain valid until closed), so pruning is safe.
+def _prune_generations(root, keep):
+    for old in _generations(root)[:-KEEP_GENERATIONS]:
+        if old != keep:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
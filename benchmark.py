@@ -0,0 +1,369 @@
+import argparse
+import asyncio
+import functools
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+
+# The benchmark never talks to Gemini unless --live-llm is given: a deterministic
+# local fake (or, with --replay-llm, the responses a live run recorded in the LLM
+# cache) is installed before search is imported, and the LLM response cache is
+# disabled so runs are comparable between commits.
+os.environ.setdefault("LLM_OFFLINE", "1")
+
+import gemini_booster
+import metrics
+from llm_cache import CACHE_PATH, LLMCache, cache_key
+
+QUERIES_PATH = "benchmark_queries.json"
+STAGES = ["rewrite", "encode", "filter", "faiss", "lexical", "rerank", "explain"]
+
+
+# === Deterministic Gemini stand-in ===
+class FakeGeminiModel:
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000.0
+
+    def generate_content(self, prompt, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeResponse(self._reply(prompt))
+
+    def _reply(self, prompt):
+        if "Rewritten Query:" in prompt:
+            # Identity rewrite keeps retrieval quality attributable to the local pipeline
+            return prompt.split("Original Query:", 1)[1].rsplit("Rewritten Query:", 1)[0].strip()
+        if '{"ranking"' in prompt:
+            # Identity ranking keeps the dense order
+            return json.dumps({"ranking": [item["id"] for item in self._items(prompt)]})
+        if '{"explanations"' in prompt:
+            return json.dumps({"explanations": {str(item["id"]): "Matches the query on test type, job level and content."
+                                                for item in self._items(prompt)}})
+        return "No matching assessments were found for this query."
+
+    def _items(self, prompt):
+        line = next(line for line in prompt.splitlines() if line.startswith("Assessments: "))
+        return json.loads(line[len("Assessments: "):])
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+# === Recorded Gemini replies ===
+# Serves the responses an earlier --live-llm run stored in the LLM cache, so the
+# gating comparison sees real rewrites and rankings without calling Gemini. A
+# prompt that was never recorded fails like the offline model and the stage
+# falls back; the misses are reported per gating mode.
+class ReplayGeminiModel:
+    def __init__(self, path, latency_ms=0.0):
+        self.recording = LLMCache(path, ttl=math.inf)  # recorded replies never expire here
+        self.latency = latency_ms / 1000.0
+
+    def generate_content(self, prompt, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        text = self.recording.get(cache_key(gemini_booster.MODEL_NAME, prompt))
+        if text is None:
+            raise RuntimeError("prompt was not recorded by a --live-llm run")
+        return FakeResponse(text)
+
+
+# === Stage timing ===
+class StageTimer:
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def wrap(self, stage, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.samples[stage].append((time.perf_counter() - start) * 1000.0)
+        return timed
+
+
+def instrument(search, timer):
+    import bm25
+
+    search.rewrite_query = timer.wrap("rewrite", search.rewrite_query)
+    search.encode_queries = timer.wrap("encode", search.encode_queries)
+    search.extract_filters_from_prompt = timer.wrap("filter", search.extract_filters_from_prompt)
+    search.candidate_ids = timer.wrap("filter", search.candidate_ids)
+    search._search_candidates = timer.wrap("faiss", search._search_candidates)
+    bm25.BM25Index.top = timer.wrap("lexical", bm25.BM25Index.top)
+    search.rerank = timer.wrap("rerank", search.rerank)
+    search.explain_results = timer.wrap("explain", search.explain_results)
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100.0 * len(ordered)) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": pick(50),
+        "p95": pick(95),
+        "p99": pick(99),
+    }
+
+
+# === Ranking metrics (binary relevance, URLs deduplicated in rank order) ===
+def dedupe(urls):
+    seen = set()
+    return [u for u in urls if not (u in seen or seen.add(u))]
+
+
+def recall_at_k(retrieved, relevant, k):
+    return len(set(retrieved[:k]) & relevant) / len(relevant) if relevant else 0.0
+
+
+def average_precision_at_k(retrieved, relevant, k):
+    hits, total = 0, 0.0
+    for i, url in enumerate(retrieved[:k], 1):
+        if url in relevant:
+            hits += 1
+            total += hits / i
+    return total / min(len(relevant), k) if relevant else 0.0
+
+
+def ndcg_at_k(retrieved, relevant, k):
+    dcg = sum(1.0 / math.log2(i + 2) for i, url in enumerate(retrieved[:k]) if url in relevant)
+    ideal = sum(1.0 / math.log2(i + 2) for i in range(min(len(relevant), k)))
+    return dcg / ideal if ideal else 0.0
+
+
+def evaluate_quality(search, queries, k, options, warm_cache):
+    per_query = []
+    for item in queries:
+        if not warm_cache:
+            search.query_cache.clear()
+            search.result_cache.clear()
+
+        start = time.perf_counter()
+        response = search.search(item["query"], top_k=k, **options)
+        elapsed = (time.perf_counter() - start) * 1000.0
+
+        retrieved = dedupe([r.get("URL", "") for r in response.get("results", [])])
+        relevant = set(item["relevant"])
+        per_query.append({
+            "query": item["query"],
+            "recall": recall_at_k(retrieved, relevant, k),
+            "ap": average_precision_at_k(retrieved, relevant, k),
+            "ndcg": ndcg_at_k(retrieved, relevant, k),
+            "total_ms": elapsed,
+            "gating": response.get("gating"),
+            "results": len(retrieved),
+            "fallback": response.get("fallback"),
+        })
+
+    n = len(per_query) or 1
+    return {
+        f"recall@{k}": sum(q["recall"] for q in per_query) / n,
+        f"map@{k}": sum(q["ap"] for q in per_query) / n,
+        f"ndcg@{k}": sum(q["ndcg"] for q in per_query) / n,
+        "total_ms": percentiles([q["total_ms"] for q in per_query]),
+        "empty": sum(1 for q in per_query if not q["results"]),
+        "per_query": per_query,
+    }
+
+
+# Prompt and response tokens sent to the LLM so far (estimated for the fake)
+def llm_tokens():
+    kinds = ("rewrite", "rerank", "explain", "fallback")
+    return {direction: sum(metrics.LLM_TOKENS.value(kind=kind, direction=direction) for kind in kinds)
+            for direction in ("prompt", "response")}
+
+
+# === Gating evaluation ===
+# The quality benchmark once per gating mode, with the rewrite / rerank calls
+# each mode made and what every later mode saves (latency) and loses (ranking
+# quality) against the first. The deterministic fake rewrites to the same text
+# and keeps the dense order, so only latency moves and every *_lost is 0. The
+# quality side needs real replies: record them once with --live-llm, then
+# compare offline with --replay-llm. Offline runs start each mode with an empty
+# LLM cache so every call reaches the model and is counted.
+def evaluate_gating(search, queries, k, options, warm_cache, modes, timer, live_llm=False):
+    replay = gemini_booster._model if isinstance(gemini_booster._model, ReplayGeminiModel) else None
+    report = {}
+    for mode in modes:
+        if not live_llm:
+            gemini_booster.cache = LLMCache(None)
+        before = {stage: len(timer.samples[stage]) for stage in ("rewrite", "rerank")}
+        tokens_before = llm_tokens()
+        misses_before = replay.recording.misses if replay else 0
+        quality = evaluate_quality(search, queries, k, dict(options, gating=mode), warm_cache)
+        quality["llm_calls"] = {stage: len(timer.samples[stage]) - n for stage, n in before.items()}
+        quality["llm_tokens"] = {direction: n - tokens_before[direction] for direction, n in llm_tokens().items()}
+        if replay:
+            quality["replay_misses"] = replay.recording.misses - misses_before
+        report[mode] = quality
+
+    baseline = report[modes[0]]
+    for mode in modes[1:]:
+        row = report[mode]
+        row[f"vs_{modes[0]}"] = {
+            "mean_ms_saved": baseline["total_ms"]["mean"] - row["total_ms"]["mean"],
+            "p50_ms_saved": baseline["total_ms"]["p50"] - row["total_ms"]["p50"],
+            "p95_ms_saved": baseline["total_ms"]["p95"] - row["total_ms"]["p95"],
+            **{f"{metric}_lost": baseline[metric] - row[metric]
+               for metric in (f"recall@{k}", f"map@{k}", f"ndcg@{k}")},
+        }
+    return report
+
+
+# === Throughput against the FastAPI app (in-process ASGI, no network) ===
+async def measure_throughput(queries, levels, requests_per_level):
+    import httpx
+    import api
+
+    transport = httpx.ASGITransport(app=api.app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        await client.post("/recommend", json={"query": queries[0]["query"]})  # warm up lazy loading
+
+        for concurrency in levels:
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies = []
+            errors = 0
+
+            async def one(i):
+                nonlocal errors
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post("/recommend", json={"query": queries[i % len(queries)]["query"]})
+                    latencies.append((time.perf_counter() - start) * 1000.0)
+                    # The API turns load failures and fallbacks into 200s with no assessments
+                    if response.status_code != 200 or not response.json().get("recommended_assessments"):
+                        errors += 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(requests_per_level)))
+            wall = time.perf_counter() - start
+
+            results.append({
+                "concurrency": concurrency,
+                "requests": requests_per_level,
+                "errors": errors,
+                "requests_per_second": requests_per_level / wall if wall else 0.0,
+                "latency_ms": percentiles(latencies),
+            })
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval quality and latency benchmark.")
+    parser.add_argument("--queries", default=QUERIES_PATH)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", default="gemini", help="gemini | cross-encoder | none")
+    parser.add_argument("--explain", action="store_true", help="include the explanation stage")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated latency per fake or replayed LLM call")
+    parser.add_argument("--live-llm", action="store_true", help="call Gemini (through the LLM cache) instead of the fake")
+    parser.add_argument("--replay-llm", action="store_true",
+                        help="replay the Gemini responses a --live-llm run recorded in the LLM cache")
+    parser.add_argument("--gating", default="", help="comma-separated gating modes to compare, e.g. always,auto")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the query-embedding cache between queries")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated levels; empty to skip")
+    parser.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    if args.live_llm:
+        gemini_booster.LLM_OFFLINE = False
+    elif args.replay_llm:
+        if not CACHE_PATH or not os.path.exists(CACHE_PATH):
+            print(f"❌ No recorded LLM responses at {CACHE_PATH!r}; run once with --live-llm first.")
+            sys.exit(1)
+        gemini_booster._model = ReplayGeminiModel(CACHE_PATH, args.llm_latency_ms)
+        gemini_booster.cache = LLMCache(None)
+    else:
+        gemini_booster._model = FakeGeminiModel(args.llm_latency_ms)
+        gemini_booster.cache = LLMCache(None)
+
+    import search
+
+    timer = StageTimer()
+    instrument(search, timer)
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = json.load(f)
+
+    options = {
+        "do_rerank": args.rerank != "none",
+        "reranker": args.rerank,
+        "include_explanations": args.explain,
+    }
+    quality = evaluate_quality(search, queries, args.k, options, args.warm_cache)
+    if quality["empty"] == len(queries):
+        # A missing index or encoder makes every query fall back; don't report zeros as a result
+        reason = quality["per_query"][0]["fallback"] if queries else "no queries"
+        print(f"❌ The quality pass returned no results: {reason}")
+        sys.exit(1)
+    if quality["empty"]:
+        print(f"[WARN] {quality['empty']}/{len(queries)} queries returned no results")
+    stage_latency = {stage: percentiles(samples) for stage, samples in timer.samples.items()}
+
+    modes = [m.strip() for m in args.gating.split(",") if m.strip()]
+    gating = {}
+    if modes and not (args.live_llm or args.replay_llm):
+        print("[WARN] The fake LLM keeps rewrites and rankings unchanged, so gating quality loss is always 0; "
+              "use --live-llm or --replay-llm to measure it")
+    if modes:
+        gating = evaluate_gating(search, queries, args.k, options, args.warm_cache, modes, timer, args.live_llm)
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    throughput = asyncio.run(measure_throughput(queries, levels, args.requests)) if levels else []
+
+    report = {
+        "commit": git_commit(),
+        "config": vars(args),
+        "quality": quality,
+        "stage_latency_ms": stage_latency,
+        "gating": gating,
+        "throughput": throughput,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n📊 recall@{args.k}={quality[f'recall@{args.k}']:.3f}  "
+          f"MAP@{args.k}={quality[f'map@{args.k}']:.3f}  nDCG@{args.k}={quality[f'ndcg@{args.k}']:.3f}")
+    for stage, row in stage_latency.items():
+        if row["count"]:
+            print(f"   {stage:>8}: p50={row['p50']:.2f}ms  p95={row['p95']:.2f}ms  p99={row['p99']:.2f}ms")
+    for mode, row in gating.items():
+        calls = row["llm_calls"]
+        line = (f"   gating={mode:<6}: nDCG@{args.k}={row[f'ndcg@{args.k}']:.3f}  mean={row['total_ms']['mean']:.1f}ms  "
+                f"rewrite calls={calls['rewrite']}/{len(queries)}  rerank calls={calls['rerank']}/{len(queries)}  "
+                f"tokens={row['llm_tokens']['prompt']:.0f}+{row['llm_tokens']['response']:.0f}")
+        if "replay_misses" in row:
+            line += f"  replay misses={row['replay_misses']}"
+        delta = row.get(f"vs_{modes[0]}")
+        if delta:
+            line += f"  saved={delta['mean_ms_saved']:.1f}ms  nDCG lost={delta[f'ndcg@{args.k}_lost']:.3f}"
+        print(line)
+    for row in throughput:
+        print(f"   concurrency={row['concurrency']:>3}: {row['requests_per_second']:.1f} req/s  "
+              f"p95={row['latency_ms']['p95']:.1f}ms  errors={row['errors']}")
+    print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
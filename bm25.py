@@ -0,0 +1,99 @@
+import numpy as np
+
+from normalization import normalize
+
+# === Settings ===
+BM25_FILE = "bm25.npz"
+K1 = 1.2
+B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is",
+    "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "we", "will", "with", "you", "your"
+}
+
+
+def tokenize(text):
+    return [t for t in normalize(text).split() if t not in STOPWORDS]
+
+
+# === Build ===
+# Postings are stored CSR-style: term_offsets[t]:term_offsets[t+1] slices the
+# doc positions and term frequencies of term t. Doc positions follow catalog row order.
+def build_bm25(texts):
+    postings = {}
+    doc_lengths = np.zeros(len(texts), dtype=np.int32)
+
+    for doc, text in enumerate(texts):
+        tokens = tokenize(text)
+        doc_lengths[doc] = len(tokens)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            postings.setdefault(token, []).append((doc, tf))
+
+    vocab = sorted(postings)
+    term_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(postings[t]) for t in vocab])
+    docs = np.array([d for t in vocab for d, _ in postings[t]], dtype=np.int32)
+    tfs = np.array([tf for t in vocab for _, tf in postings[t]], dtype=np.uint16)
+
+    return {
+        "vocab": np.array(vocab),
+        "term_offsets": term_offsets,
+        "docs": docs,
+        "tfs": tfs,
+        "doc_lengths": doc_lengths,
+        "params": np.array([K1, B], dtype=np.float32),
+    }
+
+
+def save_bm25(data, path):
+    np.savez_compressed(path, **data)
+
+
+def load_bm25(path):
+    with np.load(path) as data:
+        return BM25Index(**{key: data[key] for key in data.files})
+
+
+class BM25Index:
+    def __init__(self, vocab, term_offsets, docs, tfs, doc_lengths, params):
+        self.term_ids = {term: i for i, term in enumerate(vocab.tolist())}
+        self.term_offsets = term_offsets
+        self.docs = docs
+        self.tfs = tfs.astype(np.float32)
+        self.k1, self.b = float(params[0]), float(params[1])
+
+        n_docs = len(doc_lengths)
+        avg_length = float(doc_lengths.mean()) if n_docs else 1.0
+        df = np.diff(term_offsets).astype(np.float32)
+        self.idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        self.length_norm = self.k1 * (1.0 - self.b + self.b * doc_lengths / max(avg_length, 1e-9))
+        self.n_docs = n_docs
+
+    def scores(self, query):
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.term_ids.get(term)
+            if t is None:
+                continue
+            start, end = self.term_offsets[t], self.term_offsets[t + 1]
+            docs, tf = self.docs[start:end], self.tfs[start:end]
+            scores[docs] += self.idf[t] * tf * (self.k1 + 1.0) / (tf + self.length_norm[docs])
+        return scores
+
+    # Top-n (positions, scores) with a positive score, optionally restricted to positions
+    def top(self, query, n, positions=None):
+        scores = self.scores(query)
+        if positions is not None:
+            allowed = np.zeros(self.n_docs, dtype=bool)
+            allowed[positions] = True
+            scores[~allowed] = 0.0
+
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > n:
+            hits = hits[np.argpartition(-scores[hits], n - 1)[:n]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return hits, scores[hits]
@@ -0,0 +1,180 @@
+import re
+from collections import namedtuple
+
+import numpy as np
+
+# === Vocabularies ===
+# One bit per job level / test-type code / language / support flag. The
+# vocabulary is stored with the catalog so a change triggers a column rebuild
+# instead of silently mismatching.
+JOB_LEVELS = ["entry", "graduate", "mid", "professional", "supervisor", "manager", "director", "executive", "general"]
+
+# Catalog "Job Levels" entries -> level key
+CATALOG_JOB_LEVELS = {
+    "entry-level": "entry",
+    "graduate": "graduate",
+    "mid-professional": "mid",
+    "professional individual contributor": "professional",
+    "supervisor": "supervisor",
+    "front line manager": "manager",
+    "manager": "manager",
+    "director": "director",
+    "executive": "executive",
+    "general population": "general",
+}
+
+TEST_TYPE_CODES = {
+    "A": "Ability & Aptitude",
+    "B": "Biodata & Situational Judgement",
+    "C": "Competencies",
+    "D": "Development & 360",
+    "E": "Assessment Exercises",
+    "K": "Knowledge & Skills",
+    "P": "Personality & Behavior",
+    "S": "Simulations"
+}
+
+# Base languages; regional variants ("French (Canada)", "Latin American Spanish")
+# set the bit of their base language
+LANGUAGES = [
+    "english", "spanish", "french", "portuguese", "chinese", "dutch", "flemish", "italian", "german",
+    "finnish", "norwegian", "danish", "swedish", "japanese", "arabic", "turkish", "polish", "russian",
+    "korean", "indonesian", "romanian", "greek", "hungarian", "czech", "thai", "slovak", "serbian",
+    "latvian", "lithuanian", "estonian", "icelandic", "vietnamese", "malay"
+]
+
+TEST_TYPE_BITS = {name: 1 << i for i, name in enumerate(TEST_TYPE_CODES.values())}
+CODE_BITS = {code: TEST_TYPE_BITS[name] for code, name in TEST_TYPE_CODES.items()}
+JOB_LEVEL_BITS = {level: 1 << i for i, level in enumerate(JOB_LEVELS)}
+LANGUAGE_BITS = {language: 1 << i for i, language in enumerate(LANGUAGES)}
+FLAG_BITS = {"remote": 1, "adaptive": 2, "irt": 4}
+FLAG_FIELDS = {"remote": "Remote Testing Support", "adaptive": "Adaptive Support", "irt": "IRT Support"}
+
+FILTER_VOCABULARY = {
+    "version": 2,
+    "job_levels": JOB_LEVELS,
+    "test_types": list(TEST_TYPE_CODES),
+    "languages": LANGUAGES,
+    "flags": list(FLAG_BITS),
+}
+
+# Catalog fields the filter columns are built from
+FILTER_SOURCE_FIELDS = ["Duration", "Job Levels", "Test Type(s)", "Languages", *FLAG_FIELDS.values()]
+
+UNKNOWN_DURATION = -1
+_INT_RE = re.compile(r"\d+")
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+# Upper bound in minutes ("15 to 35" -> 35, "max 60" -> 60); untimed / unknown -> -1
+def parse_duration(value):
+    numbers = [int(n) for n in _INT_RE.findall(str(value))]
+    return max(numbers) if numbers else UNKNOWN_DURATION
+
+
+def job_level_mask(job_levels_str):
+    mask = 0
+    for entry in str(job_levels_str).lower().split(","):
+        level = CATALOG_JOB_LEVELS.get(entry.strip())
+        if level:
+            mask |= JOB_LEVEL_BITS[level]
+    return mask
+
+
+def test_type_mask(test_types_str):
+    mask = 0
+    for code in str(test_types_str).split(","):
+        mask |= CODE_BITS.get(code.strip(), 0)
+    return mask
+
+
+def language_mask(languages_str):
+    mask = 0
+    for word in _WORD_RE.findall(str(languages_str).lower()):
+        mask |= LANGUAGE_BITS.get(word, 0)
+    return mask
+
+
+def flag_mask(record):
+    mask = 0
+    for flag, field in FLAG_FIELDS.items():
+        if str(record.get(field, "")).strip().lower() == "yes":
+            mask |= FLAG_BITS[flag]
+    return mask
+
+
+# === Build ===
+def build_columns(metadata):
+    return {
+        "duration": np.array([parse_duration(r.get("Duration", "")) for r in metadata], dtype=np.int32),
+        "job_levels": np.array([job_level_mask(r.get("Job Levels", "")) for r in metadata], dtype=np.uint16),
+        "test_types": np.array([test_type_mask(r.get("Test Type(s)", "")) for r in metadata], dtype=np.uint16),
+        "languages": np.array([language_mask(r.get("Languages", "")) for r in metadata], dtype=np.uint64),
+        "flags": np.array([flag_mask(r) for r in metadata], dtype=np.uint8),
+    }
+
+
+# === Filtering ===
+# Typed, hashable form of the extracted filters; queries with equal filters are
+# grouped into one FAISS call.
+CompiledFilters = namedtuple(
+    "CompiledFilters", ["min_duration", "max_duration", "job_mask", "type_mask", "language_mask", "flag_mask"]
+)
+NO_FILTERS = CompiledFilters(None, None, 0, 0, 0, 0)
+
+
+def compile_filters(filters):
+    job_mask = 0
+    for level in filters.get("job_levels", []):
+        job_mask |= JOB_LEVEL_BITS.get(level, 0)
+
+    type_mask = 0
+    for name in filters.get("test_types", []):
+        type_mask |= TEST_TYPE_BITS.get(name, 0)
+
+    languages = 0
+    for language in filters.get("languages", []):
+        languages |= LANGUAGE_BITS.get(language, 0)
+
+    flags = 0
+    for flag, bit in FLAG_BITS.items():
+        if filters.get(flag):
+            flags |= bit
+
+    return CompiledFilters(filters.get("min_duration"), filters.get("max_duration"),
+                           job_mask, type_mask, languages, flags)
+
+
+# Boolean mask of the rows (all, or only those at positions) passing compiled
+# filters. Every check is a vectorized comparison on a precomputed column.
+#   duration   - within [min, max]; unknown durations pass
+#   job levels / test types - any requested bit
+#   languages / flags       - every requested bit
+def filter_mask(columns, compiled, positions=None):
+    def column(name):
+        return columns[name] if positions is None else columns[name][positions]
+
+    duration = column("duration")
+    keep = np.ones(len(duration), dtype=bool)
+    if compiled.max_duration is not None:
+        keep &= duration <= compiled.max_duration
+    if compiled.min_duration is not None:
+        keep &= (duration >= compiled.min_duration) | (duration == UNKNOWN_DURATION)
+    if compiled.job_mask:
+        keep &= (column("job_levels") & compiled.job_mask) != 0
+    if compiled.type_mask:
+        keep &= (column("test_types") & compiled.type_mask) != 0
+    if compiled.language_mask:
+        mask = np.uint64(compiled.language_mask)
+        keep &= (column("languages") & mask) == mask
+    if compiled.flag_mask:
+        keep &= (column("flags") & compiled.flag_mask) == compiled.flag_mask
+    return keep
+
+
+# Row positions passing the filters, or None when nothing is filtered
+def candidate_ids(columns, filters):
+    compiled = compile_filters(filters)
+    if compiled == NO_FILTERS:
+        return None
+    return np.flatnonzero(filter_mask(columns, compiled)).astype(np.int64)
@@ -0,0 +1,177 @@
+import json
+import os
+import pickle
+
+import numpy as np
+
+from catalog_columns import FILTER_SOURCE_FIELDS, FILTER_VOCABULARY, build_columns
+
+# === Paths ===
+CATALOG_DIR = "catalog_store"
+LEGACY_MAPPING_PATH = "index_mapping.pkl"
+MANIFEST = "manifest.json"
+STORE_VERSION = 1
+
+# Record field -> file stem. Each string field is an int64 offsets array plus a
+# UTF-8 heap; both are memory-mapped so workers share them via the page cache.
+STRING_FIELDS = {
+    "Assessment Name": "name",
+    "URL": "url",
+    "Remote Testing Support": "remote",
+    "Adaptive Support": "adaptive",
+    "IRT Support": "irt",
+    "Duration": "duration_text",
+    "Test Type(s)": "test_types_text",
+    "Job Levels": "job_levels_text",
+    "Languages": "languages",
+    "Description": "description",
+}
+NUMERIC_COLUMNS = ["duration", "job_levels", "test_types", "languages", "flags"]
+
+
+class StringColumn:
+    def __init__(self, offsets, heap):
+        self.offsets = offsets
+        self.heap = heap
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return bytes(self.heap[start:end]).decode("utf-8")
+
+
+# Index ids are stable across incremental rebuilds, so rows are looked up
+# through id_to_row rather than by position.
+def _id_lookup(row_ids):
+    id_to_row = np.full(int(row_ids.max()) + 1 if len(row_ids) else 0, -1, dtype=np.int64)
+    id_to_row[row_ids] = np.arange(len(row_ids))
+    return id_to_row
+
+
+# 📚 Read-only columnar catalog. record(i) materializes only the requested row.
+class CatalogStore:
+    def __init__(self, strings, columns, row_ids, content_hashes=None):
+        self.strings = strings
+        self.columns = columns
+        self.row_ids = row_ids
+        self.content_hashes = content_hashes
+        self.id_to_row = _id_lookup(row_ids)
+        self.bm25 = None  # optional lexical index over the same rows, attached by search
+        self.neighbours = None  # optional precomputed neighbour table, attached by search
+        self.index_meta = None  # type + params of the paired FAISS index, attached by search
+        self.generation = None  # published generation the pair was loaded from, attached by search
+
+    def __len__(self):
+        return len(self.columns["duration"])
+
+    def __getitem__(self, i):
+        return self.record(i)
+
+    def record(self, i, fields=None):
+        fields = fields or STRING_FIELDS.keys()
+        return {field: self.strings[field][i] for field in fields}
+
+
+# Legacy pickle wrapped in the same interface; rows are copied on access so
+# callers can annotate them freely.
+class InMemoryCatalog:
+    def __init__(self, records):
+        self.records = records
+        self.columns = build_columns(records)
+        self.row_ids = np.arange(len(records), dtype=np.int64)
+        self.content_hashes = None
+        self.id_to_row = self.row_ids
+        self.bm25 = None
+        self.neighbours = None
+        self.index_meta = None
+        self.generation = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        return self.record(i)
+
+    def record(self, i, fields=None):
+        row = self.records[i]
+        fields = fields or STRING_FIELDS.keys()
+        return {field: row.get(field, "") for field in fields}
+
+
+# === Write ===
+def write_catalog(metadata, path=CATALOG_DIR, row_ids=None, content_hashes=None):
+    os.makedirs(path, exist_ok=True)
+
+    if row_ids is None:
+        row_ids = np.arange(len(metadata), dtype=np.int64)
+    np.save(os.path.join(path, "row_ids.npy"), np.asarray(row_ids, dtype=np.int64))
+    if content_hashes is not None:
+        np.save(os.path.join(path, "content_hashes.npy"), np.array(content_hashes, dtype="S40"))
+
+    for field, stem in STRING_FIELDS.items():
+        encoded = [str(r.get(field, "")).encode("utf-8") for r in metadata]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        np.save(os.path.join(path, f"{stem}.offsets.npy"), offsets)
+        with open(os.path.join(path, f"{stem}.heap"), "wb") as f:
+            f.write(b"".join(encoded))
+
+    columns = build_columns(metadata)
+    for name in NUMERIC_COLUMNS:
+        np.save(os.path.join(path, f"{name}.npy"), columns[name])
+
+    with open(os.path.join(path, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": STORE_VERSION,
+            "rows": len(metadata),
+            "filter_vocabulary": FILTER_VOCABULARY,
+        }, f, indent=2)
+
+
+# === Open ===
+def _open_heap(file_path):
+    if os.path.getsize(file_path) == 0:
+        return np.empty(0, dtype=np.uint8)
+    return np.memmap(file_path, dtype=np.uint8, mode="r")
+
+
+def open_catalog(path=CATALOG_DIR):
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != STORE_VERSION:
+        raise ValueError(f"Unsupported catalog store version {manifest.get('version')} in {path}")
+
+    strings = {}
+    for field, stem in STRING_FIELDS.items():
+        offsets = np.load(os.path.join(path, f"{stem}.offsets.npy"), mmap_mode="r")
+        strings[field] = StringColumn(offsets, _open_heap(os.path.join(path, f"{stem}.heap")))
+
+    columns = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in NUMERIC_COLUMNS if os.path.exists(os.path.join(path, f"{name}.npy"))
+    }
+    row_ids = np.load(os.path.join(path, "row_ids.npy"))
+    hashes_path = os.path.join(path, "content_hashes.npy")
+    content_hashes = np.load(hashes_path) if os.path.exists(hashes_path) else None
+    catalog = CatalogStore(strings, columns, row_ids, content_hashes)
+
+    if manifest.get("filter_vocabulary") != FILTER_VOCABULARY or len(columns) != len(NUMERIC_COLUMNS):
+        print(f"[WARN] {path} was built with a different filter vocabulary, rebuilding filter columns")
+        rows = [catalog.record(i, FILTER_SOURCE_FIELDS) for i in range(len(row_ids))]
+        catalog.columns = build_columns(rows)
+
+    return catalog
+
+
+def load_catalog(path=CATALOG_DIR, legacy_path=LEGACY_MAPPING_PATH):
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        return open_catalog(path)
+
+    if os.path.exists(legacy_path):
+        print(f"[WARN] {path} not found, falling back to legacy {legacy_path}")
+        with open(legacy_path, "rb") as f:
+            return InMemoryCatalog(pickle.load(f))
+
+    raise FileNotFoundError(f"Catalog not found at {path} or {legacy_path}")
@@ -1,38 +1,26 @@
 import pandas as pd
-import re
 import faiss
-import pickle
-from sentence_transformers import SentenceTransformer
-from sklearn.preprocessing import normalize
+import hashlib
+import numpy as np
 import os
+import sys
+
+from catalog_columns import TEST_TYPE_CODES
+from catalog_store import load_catalog, write_catalog
+from encoder import ENCODER_BACKEND, load_encoder
+from artifacts import (ARTIFACTS_DIR, current_generation, generation_file, generation_paths,
+                       new_generation_dir, publish_generation)
+from bm25 import BM25_FILE, build_bm25, save_bm25
+from neighbours import NEIGHBOURS_TOP_N, build_neighbour_table, save_neighbour_table
+from normalization import NORMALIZATION_VERSION, normalize
+from ann_index import (INDEX_META_FILE, SUPPORTS_REMOVE, VECTORS_FILE, build_index, choose_index_type,
+                       default_params, index_meta, read_index_meta, write_index_meta)
 
 # File paths
 CSV_FILES = ["shl_data_type1.csv"]
-INDEX_PATH = "faiss_index.index"
-MAPPING_PATH = "index_mapping.pkl"
-
-# Load model
-print("📥 Loading model: all-MiniLM-L6-v2")
-model = SentenceTransformer("local_model")
-
-# Preprocessing utility (for embeddings only)
-def preprocess(text):
-    text = str(text).lower()
-    text = re.sub(r"[^a-z0-9\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
 
 # Human-readable decoding
-TEST_TYPE_MAP = {
-    "A": "Ability & Aptitude",
-    "B": "Biodata & Situational Judgement",
-    "C": "Competencies",
-    "D": "Development & 360",
-    "E": "Assessment Exercises",
-    "K": "Knowledge & Skills",
-    "P": "Personality & Behavior",
-    "S": "Simulations"
-}
+TEST_TYPE_MAP = TEST_TYPE_CODES
 
 def decode_test_types(test_type_str):
     return [TEST_TYPE_MAP.get(t.strip(), t.strip()) for t in test_type_str.split(',') if t.strip()]
@@ -60,7 +48,7 @@ def load_and_prepare_data():
                 row.get("Job Levels", ""),
                 row.get("Description", "")
             ])
-            all_texts.append(preprocess(combined_text))
+            all_texts.append(normalize(combined_text))
 
             # Raw metadata for Gemini reranking/explanation
             metadata.append({
@@ -80,15 +68,53 @@ def load_and_prepare_data():
 
     return all_texts, metadata
 
-# FAISS index creation
-def build_faiss_index(embeddings):
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-    return index
+# Content hash over the fields that feed the embedding text; a row whose hash is
+# unchanged keeps its index id and vector across rebuilds.
+def content_hash(record):
+    payload = "\x1f".join([
+        str(record.get("Assessment Name", "")),
+        str(record.get("Test Type(s)", "")),
+        str(record.get("Job Levels", "")),
+        str(record.get("Description", ""))
+    ])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+# Previous generation's index, its index_meta, hash -> [ids] and id -> vector,
+# or None when there is none (or its vectors came from other normalization rules).
+# Generations from before vectors.npy read their vectors back from the flat index.
+def load_previous_generation():
+    generation = current_generation()
+    if not generation:
+        return None
+
+    meta = read_index_meta(generation_file(generation, INDEX_META_FILE))
+    if meta["normalization"] != NORMALIZATION_VERSION:
+        print(f"🔁 Generation {generation} used text normalization v{meta['normalization']}, "
+              f"re-encoding everything with v{NORMALIZATION_VERSION}")
+        return None
+
+    index_path, catalog_dir = generation_paths(generation)
+    catalog = load_catalog(catalog_dir)
+    if catalog.content_hashes is None:
+        return None
+
+    ids_by_hash = {}
+    for row_id, h in zip(catalog.row_ids, catalog.content_hashes):
+        ids_by_hash.setdefault(h.decode("ascii"), []).append(int(row_id))
+
+    index = faiss.read_index(index_path)
+    vectors_path = generation_file(generation, VECTORS_FILE)
+    if os.path.exists(vectors_path):
+        stored = np.load(vectors_path)
+        vectors_by_id = {int(row_id): stored[i] for i, row_id in enumerate(catalog.row_ids)}
+    else:
+        vectors_by_id = {int(row_id): index.reconstruct(int(row_id)) for row_id in catalog.row_ids}
+
+    print(f"♻️ Reusing generation {generation} ({len(catalog)} rows, {meta['type']} index)")
+    return index, meta, ids_by_hash, vectors_by_id
 
 # Main pipeline
-def main():
+def main(full_rebuild=False):
     print("🔄 Loading and preparing data...")
     texts, metadata = load_and_prepare_data()
 
@@ -96,21 +122,74 @@ def main():
         print("❌ No data found to embed. Exiting.")
         return
 
-    print(f"🧠 Generating embeddings for {len(texts)} items...")
-    embeddings = model.encode(texts, show_progress_bar=True)
-    embeddings = normalize(embeddings, axis=1)
-
-    print("📦 Building FAISS index...")
-    index = build_faiss_index(embeddings)
-
-    print(f"💾 Saving index to: {INDEX_PATH}")
-    faiss.write_index(index, INDEX_PATH)
-
-    print(f"💾 Saving metadata mapping to: {MAPPING_PATH}")
-    with open(MAPPING_PATH, "wb") as f:
-        pickle.dump(metadata, f)
-
-    print("✅ Embedding and indexing complete.")
+    hashes = [content_hash(r) for r in metadata]
+    previous = None if full_rebuild else load_previous_generation()
+    index, previous_meta, ids_by_hash, vectors_by_id = previous if previous else (None, None, {}, {})
+
+    next_id = max((i for ids in ids_by_hash.values() for i in ids), default=-1) + 1
+    row_ids, to_encode = [], []
+    for row, h in enumerate(hashes):
+        if ids_by_hash.get(h):
+            row_ids.append(ids_by_hash[h].pop(0))
+        else:
+            row_ids.append(next_id)
+            to_encode.append(row)
+            next_id += 1
+
+    removed = [i for ids in ids_by_hash.values() for i in ids]
+    print(f"🧾 {len(texts) - len(to_encode)} unchanged, {len(to_encode)} new/changed, {len(removed)} removed")
+
+    embeddings = None
+    if to_encode:
+        print(f"📥 Loading model: all-MiniLM-L6-v2 ({ENCODER_BACKEND} backend)")
+        model = load_encoder(ENCODER_BACKEND)
+
+        print(f"🧠 Generating embeddings for {len(to_encode)} items...")
+        embeddings = model.encode([texts[i] for i in to_encode], show_progress_bar=True)
+        for row, vector in zip(to_encode, embeddings):
+            vectors_by_id[row_ids[row]] = vector
+
+    vectors = np.vstack([vectors_by_id[row_id] for row_id in row_ids]).astype(np.float32)
+    index_type = choose_index_type(len(row_ids))
+    params = default_params(index_type, len(row_ids), vectors.shape[1])
+
+    # The previous index is patched in place only when it is the same type with
+    # the same parameters and supports removal; otherwise it is rebuilt from the
+    # stored vectors (no re-encoding).
+    if (index is not None and previous_meta["type"] == index_type and previous_meta["params"] == params
+            and index_type in SUPPORTS_REMOVE):
+        if removed:
+            index.remove_ids(np.array(removed, dtype=np.int64))
+        if to_encode:
+            index.add_with_ids(embeddings, np.array([row_ids[i] for i in to_encode], dtype=np.int64))
+    else:
+        print(f"📦 Building {index_type} FAISS index over {len(row_ids)} vectors {params}...")
+        index = build_index(index_type, vectors, row_ids, params)
+
+    # Everything is written into a staging directory and published atomically,
+    # so a running search process never sees a half-written generation.
+    generation, staging = new_generation_dir()
+    index_path, catalog_dir = generation_paths(os.path.basename(staging))
+    bm25_path = generation_file(os.path.basename(staging), BM25_FILE)
+
+    print(f"💾 Saving index to: {index_path}")
+    faiss.write_index(index, index_path)
+    meta = index_meta(index_type, params, vectors.shape[1], len(row_ids))
+    write_index_meta(generation_file(os.path.basename(staging), INDEX_META_FILE), meta)
+    np.save(generation_file(os.path.basename(staging), VECTORS_FILE), vectors)
+
+    print(f"🧭 Precomputing top-{NEIGHBOURS_TOP_N} neighbours per assessment...")
+    save_neighbour_table(*build_neighbour_table(index, meta, vectors, row_ids), staging)
+
+    print(f"💾 Saving columnar catalog to: {catalog_dir}/")
+    write_catalog(metadata, catalog_dir, row_ids=row_ids, content_hashes=hashes)
+
+    # BM25 is cheap to rebuild, so it is always built from scratch over the same texts
+    print(f"💾 Saving BM25 lexical index to: {bm25_path}")
+    save_bm25(build_bm25(texts), bm25_path)
+
+    publish_generation(generation, staging)
+    print(f"✅ Embedding and indexing complete. Live generation: {ARTIFACTS_DIR}/{generation}")
 
 if __name__ == "__main__":
-    main()
+    main(full_rebuild="--full" in sys.argv)
@@ -0,0 +1,121 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+# === Settings ===
+QUERY_CACHE_CAPACITY = int(os.getenv("QUERY_CACHE_CAPACITY", "2048"))
+QUERY_CACHE_SPILL_PATH = os.getenv("QUERY_CACHE_SPILL_PATH", "")  # empty disables the disk tier
+QUERY_CACHE_SPILL_CAPACITY = int(os.getenv("QUERY_CACHE_SPILL_CAPACITY", "65536"))
+
+
+# 🧮 Bounded LRU of normalized float32 query embeddings keyed on preprocessed text.
+# Entries evicted from memory can spill into a memory-mapped ring buffer on disk,
+# so the page cache rather than the Python heap holds the long tail. Each
+# process spills into its own file (spill_path.<pid>): pre-forked workers share
+# the configured path, and a shared w+ memmap would hand one worker another's
+# vectors. The file is unlinked once mapped, so dead workers leave nothing behind.
+class QueryEmbeddingCache:
+    def __init__(self, capacity: int = QUERY_CACHE_CAPACITY, spill_path: Optional[str] = None,
+                 spill_capacity: int = QUERY_CACHE_SPILL_CAPACITY):
+        self.capacity = capacity
+        self.spill_path = spill_path or None
+        self.spill_capacity = spill_capacity
+        self._memory = OrderedDict()
+        self._spill = None
+        self._spill_pid = None
+        self._spill_slots = OrderedDict()  # key -> slot in the memmap
+        self._free_slots = []  # slots released by entries promoted back to memory
+        self._next_slot = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            slot = self._spill_slots.pop(key, None) if self._spill_pid == os.getpid() else None
+            if slot is not None:
+                vector = np.array(self._spill[slot], dtype=np.float32)
+                self._free_slots.append(slot)
+                self._remember(key, vector)
+                self.hits += 1
+                self.spill_hits += 1
+                return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self._remember(key, np.ascontiguousarray(vector, dtype=np.float32))
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            old_key, old_vector = self._memory.popitem(last=False)
+            if self.spill_path:
+                self._spill_out(old_key, old_vector)
+
+    def _spill_out(self, key, vector):
+        if self._spill_pid != os.getpid():
+            self._open_spill(vector.shape[0])
+
+        if key in self._spill_slots:
+            slot = self._spill_slots.pop(key)
+        elif self._free_slots:
+            slot = self._free_slots.pop()
+        elif self._next_slot < self.spill_capacity:
+            slot = self._next_slot
+            self._next_slot += 1
+        else:
+            # Ring buffer is full: reuse the least recently spilled slot
+            _, slot = self._spill_slots.popitem(last=False)
+
+        self._spill[slot] = vector
+        self._spill_slots[key] = slot
+
+    def _open_spill(self, dim):
+        # Slots mapped by a parent process are not ours to read after fork()
+        self._spill_slots.clear()
+        self._free_slots.clear()
+        self._next_slot = 0
+        path = f"{self.spill_path}.{os.getpid()}"
+        self._spill = np.memmap(path, dtype=np.float32, mode="w+", shape=(self.spill_capacity, dim))
+        self._spill_pid = os.getpid()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass  # platforms that cannot unlink an open file keep it until restart
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._spill_slots.clear()
+            self._free_slots.clear()
+            self._next_slot = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            memory_bytes = sum(v.nbytes for v in self._memory.values())
+            spill_bytes = self._spill.nbytes if self._spill is not None else 0
+            return {
+                "hits": self.hits,
+                "spill_hits": self.spill_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "spill_entries": len(self._spill_slots),
+                "memory_bytes": memory_bytes,
+                "spill_bytes": spill_bytes,
+            }
@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+# === Settings ===
+MODEL_DIR = "local_model"
+ONNX_DIR = os.path.join(MODEL_DIR, "onnx")
+ONNX_PATH = os.path.join(ONNX_DIR, "model.onnx")
+ONNX_INT8_PATH = os.path.join(ONNX_DIR, "model_int8.onnx")
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")  # torch | onnx | onnx-int8
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))  # 0 lets the runtime decide
+BATCH_SIZE = 32
+
+
+def _l2_normalize(x):
+    # Same eps as torch.nn.functional.normalize used by the Normalize module
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return (x / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+# === Torch backend (SentenceTransformer) ===
+class TorchEncoder:
+    name = "torch"
+
+    def __init__(self, model_dir=MODEL_DIR, threads=ENCODER_THREADS):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_dir)
+        self.max_seq_length = self.model.max_seq_length
+
+    def encode(self, texts, show_progress_bar=False):
+        embeddings = self.model.encode(texts, batch_size=BATCH_SIZE, show_progress_bar=show_progress_bar)
+        return _l2_normalize(np.asarray(embeddings, dtype=np.float32))
+
+
+# === ONNX Runtime backend ===
+# Reproduces the SentenceTransformer pipeline of local_model: the same fast
+# tokenizer truncated at max_seq_length, mean pooling over the attention mask,
+# then L2 normalization.
+class OnnxEncoder:
+    def __init__(self, onnx_path=ONNX_PATH, model_dir=MODEL_DIR, threads=ENCODER_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, "sentence_bert_config.json"), encoding="utf-8") as f:
+            self.max_seq_length = json.load(f)["max_seq_length"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.name = "onnx-int8" if onnx_path == ONNX_INT8_PATH else "onnx"
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        feeds = {k: v for k, v in feeds.items() if k in self.input_names}
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = feeds["attention_mask"][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return summed / counts
+
+    def encode(self, texts, show_progress_bar=False):
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        batches = [self._encode_batch(texts[i:i + BATCH_SIZE]) for i in range(0, len(texts), BATCH_SIZE)]
+        return _l2_normalize(np.vstack(batches))
+
+
+def load_encoder(backend=ENCODER_BACKEND):
+    if backend == "torch":
+        return TorchEncoder()
+    if backend == "onnx":
+        return OnnxEncoder(ONNX_PATH)
+    if backend == "onnx-int8":
+        return OnnxEncoder(ONNX_INT8_PATH)
+    raise ValueError(f"Unknown encoder backend: {backend}")
+
+
+# === Export ===
+def export_onnx(model_dir=MODEL_DIR, out_path=ONNX_PATH, quantized_path=ONNX_INT8_PATH):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    hf_model = AutoModel.from_pretrained(model_dir).eval()
+    dummy = tokenizer(["an example hiring query"], return_tensors="pt")
+
+    print(f"📤 Exporting ONNX model to: {out_path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            hf_model,
+            (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+            out_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "token_type_ids": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=14,
+        )
+
+    if quantized_path:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        print(f"🗜️ Writing dynamic int8 model to: {quantized_path}")
+        quantize_dynamic(out_path, quantized_path, weight_type=QuantType.QInt8)
+
+
+# === Parity Check ===
+# Every catalog row is used as a query against the catalog embedded by the same
+# backend; recall@k is the overlap with the torch backend's top-k neighbours.
+# A row is never its own neighbour: every backend ranks the self-match first,
+# which would pad recall with a free hit.
+def _top_k(embeddings, k):
+    scores = embeddings @ embeddings.T
+    np.fill_diagonal(scores, -np.inf)
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def parity_report(texts, backends=("onnx", "onnx-int8"), k=10):
+    start = time.perf_counter()
+    reference = TorchEncoder().encode(texts)
+    report = {"torch": {"encode_seconds": time.perf_counter() - start, "recall_at_k": 1.0}}
+    reference_top = _top_k(reference, k)
+
+    for backend in backends:
+        encoder = load_encoder(backend)
+        start = time.perf_counter()
+        embeddings = encoder.encode(texts)
+        elapsed = time.perf_counter() - start
+
+        candidate_top = _top_k(embeddings, k)
+        overlap = [len(set(a) & set(b)) / k for a, b in zip(reference_top, candidate_top)]
+        report[backend] = {
+            "encode_seconds": elapsed,
+            "recall_at_k": float(np.mean(overlap)),
+            "mean_cosine_to_torch": float(np.mean(np.sum(embeddings * reference, axis=1))),
+        }
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export encoder backends and check parity with torch.")
+    parser.add_argument("command", choices=["export", "parity"])
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx()
+    else:
+        from embedding import load_and_prepare_data
+        texts, _ = load_and_prepare_data()
+        print(f"🧪 Comparing backends on {len(texts)} catalog rows (recall@{args.k} vs torch)")
+        for backend, row in parity_report(texts, k=args.k).items():
+            print(f"{backend:>10}: recall@{args.k}={row['recall_at_k']:.4f}  encode={row['encode_seconds']:.2f}s"
+                  + (f"  cosine={row['mean_cosine_to_torch']:.5f}" if "mean_cosine_to_torch" in row else ""))
@@ -1,104 +1,202 @@
+import json
 import os
+import threading
 from typing import List, Dict
 from dotenv import load_dotenv
-import google.generativeai as genai
+
+from llm_cache import LLMCache, CACHE_PATH, cache_key
+from metrics import LLM_CALLS, record_llm_usage
 
 # 🔐 Load environment variable from .env
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+LLM_OFFLINE = os.getenv("LLM_OFFLINE", "").lower() in ("1", "true", "yes")
+LLM_TOKEN_BUDGET = int(os.getenv("LLM_TOKEN_BUDGET", "1500"))  # prompt tokens per Gemini request
+CHARS_PER_TOKEN = 4  # estimate used when the response carries no usage metadata
+CONTEXT_CHARS = (200, 120, 60, 0)  # description lengths tried, longest first, until the prompt fits
+
+
+# 📴 Local stand-in used when running offline: every call misses, so only
+# cached responses are served and each stage falls back to its non-LLM default.
+class OfflineModel:
+    def generate_content(self, prompt, **kwargs):
+        raise RuntimeError("LLM is offline and the prompt is not cached")
+
+
+# 💤 The Gemini client is created on first use so importing this module stays
+# cheap and a missing key only disables the LLM stages instead of the service.
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if LLM_OFFLINE:
+                    _model = OfflineModel()
+                else:
+                    if not api_key:
+                        raise ValueError("❌ GEMINI_API_KEY not found. Make sure it's defined in your .env file.")
+
+                    # 🔑 Configure Gemini
+                    import google.generativeai as genai
+                    genai.configure(api_key=api_key)
 
-if not api_key:
-    raise ValueError("❌ GEMINI_API_KEY not found. Make sure it's defined in your .env file.")
+                    # Load Gemini Pro model
+                    _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
 
-# 🔑 Configure Gemini
-genai.configure(api_key=api_key)
+# 🗃️ Response cache keyed on normalized prompt + model name
+cache = LLMCache(CACHE_PATH or None)
 
-# Load Gemini Pro model
-model = genai.GenerativeModel("gemini-1.5-flash")
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+# Token counts reported by Gemini, or estimated from the text when absent
+def _usage(response, prompt, text):
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or estimate_tokens(prompt)
+    response_tokens = getattr(usage, "candidates_token_count", None) or estimate_tokens(text)
+    return prompt_tokens, response_tokens
+
+
+# kind labels the token counters (rewrite, rerank, explain, fallback).
+# json_output asks Gemini for application/json so replies parse without scraping.
+def generate(prompt: str, kind: str = "other", json_output: bool = False) -> str:
+    key = cache_key(MODEL_NAME, prompt)
+    cached = cache.get(key)
+    if cached is not None:
+        LLM_CALLS.inc(outcome="cached")
+        return cached
+
+    try:
+        if json_output:
+            response = get_model().generate_content(
+                prompt, generation_config={"response_mime_type": "application/json"})
+        else:
+            response = get_model().generate_content(prompt)
+        text = response.text.strip()
+    except Exception:
+        LLM_CALLS.inc(outcome="error")
+        raise
+    LLM_CALLS.inc(outcome="ok")
+    record_llm_usage(kind, *_usage(response, prompt, text))
+    cache.put(key, text)
+    return text
+
+
+def _parse_json(text: str) -> dict:
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError(f"Gemini returned no JSON object: {text[:80]!r}")
+    return json.loads(text[start:end + 1])
+
+
+# === Token budget ===
+# The query never takes more than half of the budget; the rest goes to the
+# candidate list, whose descriptions shrink (down to names only) until the
+# prompt fits.
+def _trim_query(query: str, budget: int = LLM_TOKEN_BUDGET) -> str:
+    limit = budget * CHARS_PER_TOKEN // 2
+    return query if len(query) <= limit else query[:limit].rsplit(" ", 1)[0]
+
+
+def _compact_items(results: List[Dict], desc_chars: int, details: bool = False) -> str:
+    items = []
+    for i, r in enumerate(results):
+        item = {"id": i, "name": r["Assessment Name"]}
+        if details:
+            item["types"] = r.get("Test Type(s)", "")
+            item["levels"] = r.get("Job Levels", "")
+        if desc_chars:
+            item["desc"] = " ".join(r.get("Description", "").split())[:desc_chars]
+        items.append(item)
+    return json.dumps(items, ensure_ascii=False, separators=(",", ":"))
+
+
+def _fit_prompt(build, budget: int = LLM_TOKEN_BUDGET) -> str:
+    for desc_chars in CONTEXT_CHARS:
+        prompt = build(desc_chars)
+        if estimate_tokens(prompt) <= budget:
+            break
+    return prompt
 
 # 🌀 Rewrite Query
+# Raises when Gemini fails, like rerank and explain, so the caller can fall back
+# to the original query and mark the response degraded.
 def rewrite_query(original_query: str) -> str:
     prompt = f"""You are a helpful assistant. Rewrite this vague or ambiguous hiring query into a more specific and structured version suited for matching with assessment tests.
 
 Original Query:
-{original_query}
+{_trim_query(original_query)}
 
 Rewritten Query:"""
-    try:
-        response = model.generate_content(prompt)
-        rewritten = response.text.strip()
-        print(f"\n🔁 Gemini Rewritten Query:\n{rewritten}\n")
-        return rewritten
-    except Exception as e:
-        print(f"⚠️ Rewrite failed: {e}")
-        return original_query
+    rewritten = generate(prompt, "rewrite")
+    print(f"\n🔁 Gemini Rewritten Query:\n{rewritten}\n")
+    return rewritten
 
 
 # 🔁 Rerank Results
+# Candidates are sent as numbered JSON items and Gemini answers with the ids in
+# order. Ids it leaves out keep their original order after the ranked ones, so
+# no result is ever dropped; an unusable reply raises and the caller keeps the
+# dense order.
 def rerank_results(query: str, results: List[Dict]) -> List[Dict]:
     if not results:
         return []
 
-    context = "\n".join([
-        f"{i+1}. {r['Assessment Name']} - {r.get('Description', '')[:200]}..." for i, r in enumerate(results)
-    ])
-    prompt = f"""You are an AI that reranks test assessments based on how relevant they are to a given hiring query.
-
+    query = _trim_query(query)
+    prompt = _fit_prompt(lambda desc_chars: f"""Rerank these assessments by relevance to the hiring query, most relevant first.
 Query: {query}
+Assessments: {_compact_items(results, desc_chars)}
+Reply with JSON only: {{"ranking": [ids]}}""")
 
-Here are the current top results:
-{context}
+    ranking = _parse_json(generate(prompt, "rerank", json_output=True)).get("ranking")
+    if not isinstance(ranking, list):
+        raise ValueError("Gemini reply has no ranking list")
 
-Return a new ranking as a list of assessment names from most to least relevant.
-Output Format (just list): 
-1. Assessment A
-2. Assessment B
-...
-
-Reranked List:"""
-
-    response = model.generate_content(prompt)
-    names = [line.split(". ", 1)[-1].strip() for line in response.text.strip().splitlines() if ". " in line]
-    name_to_result = {r["Assessment Name"]: r for r in results}
-
-    reranked = []
-    for name in names:
-        if name in name_to_result:
-            reranked.append(name_to_result[name])
-        else:
-            print(f"[⚠️ Warning] Gemini returned unknown name: {name}")
-
-    return reranked if reranked else results  # Fallback to original if rerank fails
+    order = []
+    for i in ranking:
+        if isinstance(i, int) and 0 <= i < len(results) and i not in order:
+            order.append(i)
+    if not order:
+        raise ValueError("Gemini ranking has no known ids")
+    order += [i for i in range(len(results)) if i not in order]
+    return [results[i] for i in order]
 
 
 # 💡 Fallback Generation
 def generate_fallback(query: str) -> str:
     prompt = f"""No relevant assessments were found for the query below. Provide a helpful message or alternative suggestion.
 
-Query: {query}
+Query: {_trim_query(query)}
 
 Response:"""
     try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        return generate(prompt, "fallback")
     except Exception:
         return "Sorry, no matching assessments were found. Please try rephrasing your input."
 
-# 🧠 Explain Recommendation
-def explain_reasoning(query: str, assessment: Dict) -> str:
-    prompt = f"""Explain in 2-3 lines why the following assessment is suitable for this hiring query.
+# 🧠 Explain Recommendations
+# One call covers every result: Gemini gets the compact item list and returns
+# {"explanations": {id: text}}. Results it skips get an empty string so the
+# caller can substitute its default.
+def explain_results(query: str, results: List[Dict]) -> List[str]:
+    if not results:
+        return []
 
+    query = _trim_query(query)
+    prompt = _fit_prompt(lambda desc_chars: f"""For each assessment, explain in 2-3 lines why it suits the hiring query.
 Query: {query}
+Assessments: {_compact_items(results, desc_chars, details=True)}
+Reply with JSON only: {{"explanations": {{"<id>": "<explanation>"}}}}""")
 
-Assessment:
-Name: {assessment['Assessment Name']}
-Description: {assessment.get('Description', '')}
-Test Type: {assessment.get('Test Type(s)', '')}
-Job Levels: {assessment.get('Job Levels', '')}
-
-Explanation:"""
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception:
-        return "This assessment aligns well with the job requirements based on type, level, and content."
+    explanations = _parse_json(generate(prompt, "explain", json_output=True)).get("explanations")
+    if not isinstance(explanations, dict):
+        raise ValueError("Gemini reply has no explanations object")
+    return [str(explanations.get(str(i)) or "").strip() for i in range(len(results))]
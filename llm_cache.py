@@ -0,0 +1,154 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# === Settings ===
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite")
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+MEMORY_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1024"))
+DISK_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "50000"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def cache_key(model_name: str, prompt: str) -> str:
+    payload = f"{model_name}\x00{normalize_prompt(prompt)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+# 🗃️ Two-tier cache: in-process LRU in front of a SQLite table that survives restarts
+class LLMCache:
+    def __init__(self, path: Optional[str] = CACHE_PATH, ttl: float = CACHE_TTL,
+                 memory_max: int = MEMORY_MAX_ENTRIES, disk_max: int = DISK_MAX_ENTRIES):
+        self.ttl = ttl
+        self.memory_max = memory_max
+        self.disk_max = disk_max
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.path = path
+        self._conn = None
+        self._conn_pid = None
+        self._inherited = []  # connections opened before a fork, never used or closed after it
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # SQLite connections must not cross fork(), and pre-forked workers import
+    # this module in the parent. Each process opens its own connection on first
+    # use; one inherited from the parent is set aside untouched.
+    def _connection(self):
+        if not self.path:
+            return None
+        pid = os.getpid()
+        if self._conn_pid != pid:
+            if self._conn is not None:
+                self._inherited.append(self._conn)
+            self._conn, self._conn_pid = self._open(), pid
+        return self._conn
+
+    def _open(self):
+        try:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache(accessed)")
+            conn.commit()
+            return conn
+        except sqlite3.Error as e:
+            print(f"[WARN] LLM disk cache unavailable ({self.path}): {e}")
+            return None
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            conn = self._connection()
+            if conn is not None:
+                row = conn.execute(
+                    "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created = row
+                    if now - created <= self.ttl:
+                        conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+                        conn.commit()
+                        self._remember(key, value, created)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    conn.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            conn = self._connection()
+            if conn is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now),
+                )
+                self._evict_disk(conn, now)
+                conn.commit()
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, conn, now):
+        conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        if count > self.disk_max:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY accessed ASC LIMIT ?)",
+                (count - self.disk_max,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            conn = self._connection()
+            if conn is not None:
+                conn.execute("DELETE FROM llm_cache")
+                conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            disk_entries = 0
+            conn = self._connection()
+            if conn is not None:
+                (disk_entries,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
@@ -0,0 +1,87 @@
+import os
+
+from bm25 import tokenize
+from metrics import LLM_GATE_DECISIONS
+from reranker import DEFAULT_RERANKER
+
+# === Settings ===
+# auto   - decide per request from local signals (default)
+# always - every request pays for the Gemini rewrite and rerank
+# never  - the local pipeline only
+GATING_MODES = ("auto", "always", "never")
+LLM_GATING = os.getenv("LLM_GATING", "auto")
+
+GATE_MIN_WORDS = int(os.getenv("GATE_MIN_WORDS", "3"))      # shorter queries are too vague to skip the rewrite
+GATE_MIN_SPECIFICITY = float(os.getenv("GATE_MIN_SPECIFICITY", "0.6"))  # share of terms the catalog knows
+GATE_REWRITE_GAP = float(os.getenv("GATE_REWRITE_GAP", "0.03"))  # cosine gap between the top two dense hits
+GATE_RERANK_GAP = float(os.getenv("GATE_RERANK_GAP", "0.06"))
+
+
+# === Signals ===
+# Cosine gap between the two best dense scores, counting catalog rows that share
+# a URL once. Legacy flat-l2 indexes store squared distances between unit
+# vectors, which convert as cos = 1 - d / 2.
+def score_gap(results, metric):
+    best = {}
+    for r in results:
+        score = r.get("Score")
+        if score is None:
+            continue
+        if metric == "l2":
+            score = 1.0 - score / 2.0
+        url = r.get("URL") or id(r)
+        best[url] = max(best.get(url, score), score)
+    scores = sorted(best.values(), reverse=True)
+    return scores[0] - scores[1] if len(scores) >= 2 else None
+
+
+def query_signals(query, filters, results, metric, bm25=None):
+    terms = tokenize(query)
+    specificity = None
+    if bm25 is not None and terms:
+        specificity = sum(term in bm25.term_ids for term in terms) / len(terms)
+    return {
+        "words": len(terms),
+        "specificity": specificity,
+        "filters": any(filters.values()),
+        "score_gap": score_gap(results, metric),
+    }
+
+
+# === Decisions ===
+# Each decision is {"call": bool, "reason": str} and is counted per stage.
+def _decision(stage, call, reason):
+    LLM_GATE_DECISIONS.inc(stage=stage, decision="call" if call else "skip")
+    return {"call": call, "reason": reason}
+
+
+# Long job descriptions are already chunked and fused locally, so they go
+# through the same checks instead of being handed to Gemini to condense.
+def decide_rewrite(mode, signals=None):
+    if mode not in GATING_MODES:
+        raise ValueError(f"Unknown gating mode: {mode}. Choose one of {', '.join(GATING_MODES)}")
+    if mode != "auto":
+        return _decision("rewrite", mode == "always", mode)
+
+    gap = signals["score_gap"]
+    if signals["words"] < GATE_MIN_WORDS:
+        return _decision("rewrite", True, "short query")
+    if signals["specificity"] is not None and signals["specificity"] < GATE_MIN_SPECIFICITY:
+        return _decision("rewrite", True, "terms unknown to the catalog")
+    if signals["filters"]:
+        return _decision("rewrite", False, "specific query with filters")
+    if gap is not None and gap >= GATE_REWRITE_GAP:
+        return _decision("rewrite", False, "clear top hit")
+    return _decision("rewrite", True, "no clear top hit")
+
+
+# Only the Gemini reranker is gated; the local cross-encoder always runs when asked for
+def decide_rerank(mode, gap, reranker=None):
+    reranker = reranker or DEFAULT_RERANKER
+    if reranker != "gemini":
+        return {"call": True, "reason": f"{reranker} reranker is not gated"}
+    if mode != "auto":
+        return _decision("rerank", mode == "always", mode)
+    if gap is not None and gap >= GATE_RERANK_GAP:
+        return _decision("rerank", False, "clear top hit")
+    return _decision("rerank", True, "close scores")
@@ -0,0 +1,202 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# === Lightweight Prometheus metrics ===
+# In-process counters and histograms rendered in the Prometheus text format.
+# Recording is a lock + a bisect, cheap enough to leave on under full load.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+# Every sample carries the worker that produced it. Under the pre-fork server
+# each worker keeps its own registry, so two workers' counters must never share
+# a series. serve.py sets METRICS_WORKER to the worker slot, which survives a
+# restart; anywhere else it is the pid.
+def worker_label():
+    return os.getenv("METRICS_WORKER") or str(os.getpid())
+
+
+def _label_text(names, values):
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in (("worker", worker_label()), *zip(names, values)))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(n, "") for n in self.labels), 0.0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[slot] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_label_text(names, key + (le,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {series[-1]}")
+        return lines
+
+
+# Values owned by other objects (e.g. cache hit counts) are read at scrape time.
+# collect() returns a list of (label values, value).
+class CallbackMetric:
+    def __init__(self, name, help_text, metric_type, labels, collect):
+        self.name, self.help, self.type, self.labels = name, help_text, metric_type, tuple(labels)
+        self.collect = collect
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        try:
+            samples = self.collect()
+        except Exception:
+            samples = []
+        for key, value in samples:
+            lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+# Resident memory split for one process (Linux /proc), in bytes. "private" is
+# what the process alone holds; pages shared with forked siblings count in
+# "shared" and proportionally in "pss".
+def process_memory(pid="self"):
+    fields = {"Rss": "rss", "Pss": "pss", "Private_Clean": "private", "Private_Dirty": "private",
+              "Shared_Clean": "shared", "Shared_Dirty": "shared"}
+    usage = {"rss": 0, "pss": 0, "private": 0, "shared": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    usage[fields[key]] += int(rest.split()[0]) * 1024
+    except (FileNotFoundError, PermissionError, ValueError):
+        return {}
+    return usage
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# === Pipeline metrics ===
+STAGE_SECONDS = Histogram("shl_stage_duration_seconds", "Time spent in each search pipeline stage.", ["stage"])
+REQUEST_SECONDS = Histogram("shl_request_duration_seconds", "End-to-end API request latency.", ["endpoint"])
+REQUESTS = Counter("shl_requests_total", "API requests by endpoint and outcome.", ["endpoint", "status"])
+SEARCHES = Counter("shl_searches_total", "Queries searched, by entry point.", ["path"])
+FALLBACK_RESPONSES = Counter("shl_fallback_responses_total",
+                             "Searches answered with a fallback message instead of results.", ["path"])
+STAGE_FALLBACKS = Counter("shl_stage_fallbacks_total",
+                          "Stages that fell back to their non-LLM default.", ["stage", "reason"])
+LLM_CALLS = Counter("shl_llm_calls_total", "LLM prompts by outcome (cached, ok, error).", ["outcome"])
+LLM_TOKENS = Counter("shl_llm_tokens_total",
+                     "LLM tokens sent and received, by prompt kind and direction (prompt, response).",
+                     ["kind", "direction"])
+LLM_GATE_DECISIONS = Counter("shl_llm_gate_decisions_total",
+                             "Adaptive gating decisions per LLM stage (call, skip).", ["stage", "decision"])
+
+
+# === Timing spans ===
+# Every span feeds STAGE_SECONDS. Inside start_trace() the per-stage milliseconds
+# are also collected for the debug payload; the context var follows the request
+# into asyncio.to_thread workers.
+_trace = contextvars.ContextVar("shl_trace", default=None)
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = _trace.get()
+        if trace is not None:
+            trace[stage] = trace.get(stage, 0.0) + elapsed * 1000.0
+
+
+@contextmanager
+def start_trace():
+    trace = {}
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+# === LLM usage ===
+# Every uncached Gemini call feeds LLM_TOKENS. Inside start_usage() the counts
+# are also summed per prompt kind for the debug payload, like start_trace().
+# Pass an existing dict to keep adding to it from another thread.
+_usage = contextvars.ContextVar("shl_llm_usage", default=None)
+
+
+def record_llm_usage(kind, prompt_tokens, response_tokens):
+    LLM_TOKENS.inc(prompt_tokens, kind=kind, direction="prompt")
+    LLM_TOKENS.inc(response_tokens, kind=kind, direction="response")
+    usage = _usage.get()
+    if usage is not None:
+        entry = usage.setdefault(kind, {"calls": 0, "prompt_tokens": 0, "response_tokens": 0})
+        entry["calls"] += 1
+        entry["prompt_tokens"] += prompt_tokens
+        entry["response_tokens"] += response_tokens
+
+
+@contextmanager
+def start_usage(usage=None):
+    usage = {} if usage is None else usage
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
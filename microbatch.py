@@ -0,0 +1,47 @@
+import asyncio
+
+
+# 📦 Merges requests that arrive within a short window into one call of
+# batch_fn(items) -> list of outputs (same order). Must be used from a single event loop.
+class MicroBatcher:
+    def __init__(self, batch_fn, window_ms=5.0, max_batch=32):
+        self.batch_fn = batch_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            outputs = await asyncio.to_thread(self.batch_fn, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), output in zip(batch, outputs):
+            if not future.done():
+                future.set_result(output)
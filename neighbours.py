@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+
+from ann_index import search_parameters
+from catalog_columns import NO_FILTERS, compile_filters, filter_mask
+
+# === Settings ===
+NEIGHBOURS_FILE = "neighbours.npy"            # int32 catalog row positions, -1 padded
+NEIGHBOUR_SCORES_FILE = "neighbour_scores.npy"  # float16 cosine similarities
+NEIGHBOURS_TOP_N = int(os.getenv("NEIGHBOURS_TOP_N", "50"))
+MMR_MIN_SIMILARITY = float(os.getenv("MMR_MIN_SIMILARITY", "0.9"))  # less similar rows are not redundant
+BUILD_BLOCK_ROWS = 4096
+
+
+# === Build ===
+# Every catalog vector is searched against the generation's own index, so the
+# table costs one batched search at build time. Row i lists the top-n other
+# rows by cosine similarity, as catalog row positions.
+def build_neighbour_table(index, meta, vectors, row_ids, n=NEIGHBOURS_TOP_N):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    n_rows = len(row_ids)
+    n = min(n, max(n_rows - 1, 0))
+
+    id_to_row = np.full(int(row_ids.max()) + 1 if n_rows else 0, -1, dtype=np.int64)
+    id_to_row[row_ids] = np.arange(n_rows)
+
+    positions = np.full((n_rows, n), -1, dtype=np.int32)
+    scores = np.zeros((n_rows, n), dtype=np.float16)
+    params = search_parameters(meta, k=n + 1)
+    for start in range(0, n_rows, BUILD_BLOCK_ROWS):
+        block = vectors[start:start + BUILD_BLOCK_ROWS]
+        block_scores, block_ids = index.search(block, n + 1, params=params)
+        block_rows = np.where(block_ids >= 0, id_to_row[np.maximum(block_ids, 0)], -1)
+
+        # Move each row itself (and padding) to the end, keeping the order of the rest
+        own = np.arange(start, start + len(block))[:, None]
+        order = np.argsort((block_rows == own) | (block_rows < 0), axis=1, kind="stable")
+        block_rows = np.take_along_axis(block_rows, order, axis=1)[:, :n]
+        block_scores = np.take_along_axis(block_scores, order, axis=1)[:, :n]
+
+        positions[start:start + len(block)] = np.where(block_rows == own, -1, block_rows)
+        scores[start:start + len(block)] = block_scores
+    return positions, scores
+
+
+def save_neighbour_table(positions, scores, directory):
+    np.save(os.path.join(directory, NEIGHBOURS_FILE), positions)
+    np.save(os.path.join(directory, NEIGHBOUR_SCORES_FILE), scores)
+
+
+# Memory-mapped, so pre-forked workers share the pages; None when the generation
+# was built before the table existed
+def load_neighbour_table(directory):
+    path = os.path.join(directory, NEIGHBOURS_FILE)
+    if not os.path.exists(path):
+        return None
+    return NeighbourTable(np.load(path, mmap_mode="r"),
+                          np.load(os.path.join(directory, NEIGHBOUR_SCORES_FILE), mmap_mode="r"))
+
+
+class NeighbourTable:
+    def __init__(self, positions, scores):
+        self.positions = positions
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.positions)
+
+    def neighbours(self, position):
+        row = np.asarray(self.positions[position])
+        valid = row >= 0
+        return row[valid], np.asarray(self.scores[position][valid], dtype=np.float32)
+
+    # Top-n neighbours of one row that pass the filters. Only the stored row is
+    # checked, so a narrow filter can return fewer than n.
+    def similar(self, position, n, columns=None, filters=None):
+        rows, scores = self.neighbours(position)
+        compiled = compile_filters(filters or {})
+        if compiled != NO_FILTERS:
+            keep = filter_mask(columns, compiled, rows)
+            rows, scores = rows[keep], scores[keep]
+        return rows[:n], scores[:n]
+
+
+# === Diversification ===
+# MMR over a ranked list of row positions: relevance falls linearly with rank,
+# redundancy is the highest table similarity to an already selected row. Only
+# near-identical rows (>= min_similarity) count, so related but distinct
+# assessments (Core Java / Java 8) keep their places. lam=1 keeps the ranking
+# unchanged. The first k picks are diversified; the rest follow in order.
+def mmr(ranked, table, k, lam, min_similarity=MMR_MIN_SIMILARITY):
+    if lam >= 1.0 or len(ranked) <= 1:
+        return list(ranked)
+
+    relevance = {p: 1.0 - i / len(ranked) for i, p in enumerate(ranked)}
+    redundancy = dict.fromkeys(ranked, 0.0)
+    selected, remaining = [], list(ranked)
+    while remaining and len(selected) < k:
+        best = max(remaining, key=lambda p: lam * relevance[p] - (1.0 - lam) * redundancy[p])
+        selected.append(best)
+        remaining.remove(best)
+        for row, score in zip(*table.neighbours(best)):
+            row = int(row)
+            if row in redundancy and score >= min_similarity and score > redundancy[row]:
+                redundancy[row] = float(score)
+    return selected + remaining
@@ -0,0 +1,52 @@
+import re
+
+# === Text normalization ===
+# One normalizer for index texts and queries. Its version is stored in each
+# generation's index_meta.json; a server only loads indexes whose version it can
+# reproduce, so query text is always normalized the way the index was.
+NORMALIZATION_VERSION = 2
+
+# Symbols that carry meaning in job descriptions and would otherwise collapse
+# to a bare letter ("C++/C#" -> "c c")
+_SYMBOL_TERMS = (("c++", " cplusplus "), ("c#", " csharp "), ("f#", " fsharp "), (".net", " dotnet "))
+
+# Byte table: ASCII digits and lowercase letters pass through, every other byte
+# (punctuation, whitespace, UTF-8 continuation bytes) becomes a space
+_KEEP = set(range(ord("0"), ord("9") + 1)) | set(range(ord("a"), ord("z") + 1))
+_TABLE = bytes(b if b in _KEEP else ord(" ") for b in range(256))
+
+
+# Lowercase, keep [a-z0-9] tokens separated by single spaces. Works in a few
+# C-level passes (lower, translate, split/join) with no regex, so pasted
+# multi-kilobyte job descriptions stay cheap.
+def normalize(text):
+    text = str(text).lower()
+    if "+" in text or "#" in text or ".net" in text:
+        for symbol, term in _SYMBOL_TERMS:
+            if symbol in text:
+                text = text.replace(symbol, term)
+    return " ".join(text.encode("utf-8").translate(_TABLE).decode("ascii").split())
+
+
+# Version 1 is the original embedding-time preprocess. Indexes built with it
+# (including the legacy faiss_index.index) keep being served with their own rules.
+_V1_STRIP = re.compile(r"[^a-z0-9\s]")
+_V1_SPACES = re.compile(r"\s+")
+
+
+def normalize_v1(text):
+    text = _V1_STRIP.sub(" ", str(text).lower())
+    return _V1_SPACES.sub(" ", text).strip()
+
+
+NORMALIZERS = {1: normalize_v1, 2: normalize}
+
+
+def get_normalizer(version):
+    try:
+        return NORMALIZERS[version]
+    except KeyError:
+        raise ValueError(
+            f"Index was built with text normalization v{version}, but this server supports "
+            f"{sorted(NORMALIZERS)}; rebuild it with `python embedding.py --full`"
+        ) from None
@@ -0,0 +1,196 @@
+import math
+import re
+
+from catalog_columns import LANGUAGES, TEST_TYPE_CODES
+from normalization import normalize
+
+# === Keyword phrases ===
+# Every phrase maps to (filter key, value). Phrases are matched on whole
+# normalized tokens, so "management" no longer triggers "manager" and a stray
+# "skills" in a job description does not turn on a test-type filter. Words that
+# are ordinary job-description vocabulary ("an adaptive analyst who can exercise
+# judgement", "fluent English") only count next to a test noun.
+TEST_NOUNS = ["test", "testing", "assessment", "questionnaire", "exam"]
+
+
+def _with_test_nouns(*words):
+    return [f"{word} {noun}" for word in words for noun in TEST_NOUNS]
+
+
+JOB_LEVEL_PHRASES = {
+    "entry": ["entry level", "entry", "junior", "fresher", "beginner"],
+    "graduate": ["graduate", "new grad", "campus hire", "intern", "internship", "trainee"],
+    "mid": ["mid level", "mid", "mid senior", "intermediate", "experienced", "senior"],
+    "professional": ["professional", "individual contributor", "senior"],
+    "supervisor": ["supervisor", "team lead", "team leader"],
+    "manager": ["manager", "front line manager", "line manager"],
+    "director": ["director", "head of"],
+    "executive": ["executive", "c level", "c suite", "vp", "vice president", "ceo", "cxo"],
+}
+
+TEST_TYPE_PHRASES = {
+    "A": ["ability test", "aptitude", "cognitive", "reasoning", "numerical reasoning", "verbal reasoning"],
+    "B": ["biodata", "situational", "situational judgement", "situational judgment", "sjt"],
+    "C": ["competency based", "competency framework", *_with_test_nouns("competency")],
+    "D": ["360 feedback", "360 degree", "development assessment", "development report"],
+    "E": ["assessment exercise", "in tray", "in tray exercise", "inbox exercise", "role play", "group exercise",
+          "assessment centre", "assessment center"],
+    "K": ["knowledge test", "skills test", "skill test", "technical test", "technical assessment", "coding test",
+          "knowledge and skills", "knowledge assessment"],
+    "P": ["personality", *_with_test_nouns("behavior", "behaviour", "behavioral", "behavioural")],
+    "S": ["simulation", "simulated"],
+}
+
+FLAG_PHRASES = {
+    "remote": ["remote testing", "remote test", "remote assessment", "remote proctoring", "remotely proctored",
+               "test remotely", "tested remotely", "taken remotely", "administered remotely"],
+    "adaptive": ["computer adaptive", "adaptive version", *_with_test_nouns("adaptive")],
+    "irt": ["irt", "item response theory"],
+}
+
+# A language is the language of the test, so it needs that context: "test in
+# English", "Spanish version", "Polish-speaking". "Fluent English" or "polish
+# the UI" in a job description is not a filter.
+LANGUAGE_CONTEXTS = [*(f"{noun} in {{}}" for noun in TEST_NOUNS),
+                     "available in {}", "administered in {}", "delivered in {}",
+                     "{} version", "{} language", "{} speaking", "{} speaker"]
+LANGUAGE_NAMES = {language: [language] for language in LANGUAGES}
+LANGUAGE_NAMES["chinese"] += ["mandarin", "cantonese"]
+
+LANGUAGE_PHRASES = {
+    language: [context.format(name) for name in names for context in LANGUAGE_CONTEXTS]
+    for language, names in LANGUAGE_NAMES.items()
+}
+
+
+# Plurals match their singular ("managers", "simulations")
+def _stem(token):
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+
+# === Compiled matcher ===
+# first token -> [(phrase tokens, actions)], longest phrase first. A query is
+# scanned once; at each position the longest matching phrase wins. A match that
+# lies inside an earlier one is skipped ("mid senior" does not also count
+# "senior"), but overlapping ones count, so "knowledge test in English" yields
+# both the test type and the language.
+def _compile_phrases():
+    entries = {}
+    groups = [
+        ("job_levels", JOB_LEVEL_PHRASES),
+        ("test_types", {TEST_TYPE_CODES[code]: phrases for code, phrases in TEST_TYPE_PHRASES.items()}),
+        ("flags", FLAG_PHRASES),
+        ("languages", LANGUAGE_PHRASES),
+    ]
+    for key, table in groups:
+        for value, phrases in table.items():
+            for phrase in phrases:
+                tokens = tuple(_stem(t) for t in normalize(phrase).split())
+                entries.setdefault(tokens, []).append((key, value))
+
+    matcher = {}
+    for tokens, actions in entries.items():
+        matcher.setdefault(tokens[0], []).append((tokens, actions))
+    for candidates in matcher.values():
+        candidates.sort(key=lambda c: len(c[0]), reverse=True)
+    return matcher
+
+
+_MATCHER = _compile_phrases()
+
+
+def match_keywords(text):
+    tokens = [_stem(t) for t in normalize(text).split()]
+    found = {"job_levels": [], "test_types": [], "flags": [], "languages": []}
+
+    covered = 0  # end of the furthest match so far
+    for i in range(len(tokens)):
+        for phrase, actions in _MATCHER.get(tokens[i], ()):
+            if tuple(tokens[i:i + len(phrase)]) == phrase:
+                if i + len(phrase) > covered:
+                    for key, value in actions:
+                        if value not in found[key]:
+                            found[key].append(value)
+                    covered = i + len(phrase)
+                break
+    return found
+
+
+# === Durations ===
+# "30 minutes", "1 hour", "1.5 hrs", "half an hour", "30-40 mins", "between 20
+# and 30 minutes", "under 45 min", "at least 20 minutes", "1 hour 30 minutes".
+# One compiled pattern, one pass over the lowercased text. Word amounts ("a",
+# "an", "one") need a space and a spelled-out unit, so "Amin" or "ah," never
+# read as a duration.
+_MAX_QUALIFIERS = {"under", "less than", "fewer than", "within", "at most", "no more than", "not more than",
+                   "max", "maximum", "up to", "below", "shorter than"}
+_MIN_QUALIFIERS = {"at least", "more than", "over", "min", "minimum", "longer than"}
+
+DURATION_RE = re.compile(r"""
+    (?:(?P<qual>under|less\s+than|fewer\s+than|within|at\s+most|no\s+more\s+than|not\s+more\s+than|
+        maximum|max|up\s+to|below|shorter\s+than|at\s+least|more\s+than|over|minimum|min|longer\s+than|
+        between)(?:\s+of)?\s+)?
+    \b(?:
+        (?P<a>\d+(?:\.\d+)?)
+        (?:\s*(?:-|–|to|and)\s*(?P<b>\d+(?:\.\d+)?))?
+        \s*(?P<unit>hours?|hrs?|h|minutes?|mins?)
+      | (?P<word>half\s+an?|an?|one)\s+(?P<word_unit>hours?|hrs?|minutes?|mins?)
+    )\b
+""", re.VERBOSE)
+
+_WORD_NUMBERS = {"a": 1.0, "an": 1.0, "one": 1.0}
+
+
+def _amount(text):
+    text = " ".join(text.split())
+    if text.startswith("half"):
+        return 0.5
+    return _WORD_NUMBERS.get(text) or float(text)
+
+
+def _minutes(value, unit):
+    return value * 60 if unit.startswith("h") else value
+
+
+def parse_durations(text):
+    text = str(text).lower()
+    bounds = {}
+    previous = None  # (end, minutes) of an unqualified hours match, for "1 hour 30 minutes"
+
+    for match in DURATION_RE.finditer(text):
+        qual = " ".join((match.group("qual") or "").split())
+        unit = match.group("unit") or match.group("word_unit")
+        low = _minutes(_amount(match.group("a") or match.group("word")), unit)
+        high = _minutes(float(match.group("b")), unit) if match.group("b") else None
+
+        if (previous and not qual and not unit.startswith("h")
+                and text[previous[0]:match.start()].strip() in ("", "and")):
+            low += previous[1]
+            bounds["max_duration"] = math.ceil(low)
+            previous = None
+            continue
+        previous = (match.end(), low) if unit.startswith("h") and not qual and high is None else None
+
+        if high is not None or qual == "between":
+            bounds.setdefault("min_duration", math.floor(low))
+            bounds.setdefault("max_duration", math.ceil(high if high is not None else low))
+        elif qual in _MIN_QUALIFIERS:
+            bounds.setdefault("min_duration", math.floor(low))
+        else:  # max qualifiers and bare durations ("completed in 40 minutes")
+            bounds.setdefault("max_duration", math.ceil(low))
+    return bounds
+
+
+# === Extraction ===
+# Returns the filter dict consumed by catalog_columns.compile_filters:
+#   min_duration / max_duration (minutes), job_levels, test_types (names),
+#   languages, and remote / adaptive / irt set to True when required.
+def extract_filters(prompt):
+    found = match_keywords(prompt)
+    filters = parse_durations(prompt)
+    filters["job_levels"] = found["job_levels"]
+    filters["test_types"] = found["test_types"]
+    filters["languages"] = found["languages"]
+    for flag in found["flags"]:
+        filters[flag] = True
+    return filters
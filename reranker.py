@@ -0,0 +1,102 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from gemini_booster import rerank_results
+from metrics import STAGE_FALLBACKS
+
+# === Settings ===
+RERANKERS = ("gemini", "cross-encoder", "none")
+DEFAULT_RERANKER = os.getenv("RERANKER", "gemini")
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+CROSS_ENCODER_BUDGET_MS = float(os.getenv("CROSS_ENCODER_BUDGET_MS", "300"))
+CROSS_ENCODER_BATCH_SIZE = int(os.getenv("CROSS_ENCODER_BATCH_SIZE", "16"))
+CROSS_ENCODER_WORKERS = int(os.getenv("CROSS_ENCODER_WORKERS", "2"))
+CROSS_ENCODER_QUEUE = int(os.getenv("CROSS_ENCODER_QUEUE", "2"))  # calls allowed to wait for a worker
+PASSAGE_CHARS = 600
+
+
+def passage(record):
+    return " | ".join([
+        record.get("Assessment Name", ""),
+        record.get("Job Levels", ""),
+        record.get("Description", "")[:PASSAGE_CHARS]
+    ])
+
+
+# 🎯 Local CPU cross-encoder. Loading and scoring run in a worker thread under
+# the latency budget; once it is spent the stage gives up, returns None (the
+# caller keeps the dense order) and the late scores are discarded. A cold model therefore
+# loads in the background while the first requests keep the dense order. A call
+# that misses its budget is cancelled if it has not started, and once every
+# worker and queue slot is taken new calls fall back at once instead of queueing.
+class CrossEncoderReranker:
+    def __init__(self, model_name=CROSS_ENCODER_MODEL, budget_ms=CROSS_ENCODER_BUDGET_MS,
+                 batch_size=CROSS_ENCODER_BATCH_SIZE, workers=CROSS_ENCODER_WORKERS, queue=CROSS_ENCODER_QUEUE):
+        self.model_name = model_name
+        self.budget = budget_ms / 1000.0
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+        # Threads start on the first rerank, never in a pre-fork parent (warmup scores inline)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cross-encoder")
+        self._slots = threading.BoundedSemaphore(workers + queue)  # running + waiting calls
+
+    def get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, max_length=256)
+        return self._model
+
+    def score(self, pairs):
+        model = self.get_model()
+        scores = []
+        for i in range(0, len(pairs), self.batch_size):
+            scores.extend(float(s) for s in model.predict(pairs[i:i + self.batch_size], show_progress_bar=False))
+        return scores
+
+    # Loads the weights and scores one pair so the first request pays for neither
+    def warmup(self):
+        self.score([("warmup hiring query", "warmup assessment")])
+
+    def rerank(self, query, results):
+        if len(results) < 2:
+            return results
+
+        if not self._slots.acquire(blocking=False):
+            print("[WARN] Cross-encoder busy, keeping dense order")
+            STAGE_FALLBACKS.inc(stage="rerank", reason="busy")
+            return None
+
+        future = self._pool.submit(self.score, [(query, passage(r)) for r in results])
+        future.add_done_callback(lambda _: self._slots.release())  # also runs when cancelled
+        try:
+            scores = future.result(timeout=self.budget)
+        except FutureTimeoutError:
+            future.cancel()
+            print(f"[WARN] Cross-encoder exceeded {self.budget * 1000:.0f}ms budget, keeping dense order")
+            STAGE_FALLBACKS.inc(stage="rerank", reason="budget")
+            return None
+
+        for r, score in zip(results, scores):
+            r["Rerank Score"] = score
+        return sorted(results, key=lambda r: r["Rerank Score"], reverse=True)
+
+
+cross_encoder = CrossEncoderReranker()
+
+
+# Dispatches to the selected backend; None uses DEFAULT_RERANKER. Returns None
+# when the backend fell back, so the search marks the response degraded and
+# does not cache the dense order.
+def rerank(query, results, reranker=None):
+    reranker = reranker or DEFAULT_RERANKER
+    if reranker == "gemini":
+        return rerank_results(query, results)
+    if reranker == "cross-encoder":
+        return cross_encoder.rerank(query, results)
+    if reranker == "none":
+        return results
+    raise ValueError(f"Unknown reranker: {reranker}. Choose one of {', '.join(RERANKERS)}")
@@ -0,0 +1,122 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import faiss
+import numpy as np
+
+# === Settings ===
+RESULT_CACHE_CAPACITY = int(os.getenv("RESULT_CACHE_CAPACITY", "1024"))  # 0 disables the cache
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_THRESHOLD = float(os.getenv("RESULT_CACHE_THRESHOLD", "0.95"))  # cosine similarity
+RESULT_CACHE_NEIGHBOURS = 8
+
+
+# ♻️ Final responses of past searches, found by query embedding. A new query is
+# served from here when a stored query is within the cosine threshold AND was
+# searched with the same key (extracted filters + search options), so "java dev,
+# 40 minutes" reuses "Java developer 40 mins" but never "Java developer 20 mins".
+# Entries expire after the TTL, the least recently used go first once over
+# capacity, and everything is dropped when the index generation changes.
+class SemanticResultCache:
+    def __init__(self, capacity: int = RESULT_CACHE_CAPACITY, ttl: float = RESULT_CACHE_TTL,
+                 threshold: float = RESULT_CACHE_THRESHOLD):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.threshold = threshold
+        self._index = None  # inner product over normalized vectors = cosine
+        self._entries = OrderedDict()  # id -> (key, response, created)
+        self._next_id = 0
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, vector: np.ndarray, key, generation) -> Optional[dict]:
+        if not self.capacity:
+            return None
+
+        with self._lock:
+            self._check_generation(generation)
+            if self._entries:
+                now = time.time()
+                query = self._prepare(vector)
+                scores, ids = self._index.search(query, min(RESULT_CACHE_NEIGHBOURS, len(self._entries)))
+                for score, entry_id in zip(scores[0], ids[0].tolist()):
+                    if entry_id < 0 or score < self.threshold:
+                        break
+                    entry_key, response, created = self._entries[entry_id]
+                    if now - created > self.ttl:
+                        self._remove([entry_id])
+                        continue
+                    if entry_key == key:
+                        self._entries.move_to_end(entry_id)
+                        self.hits += 1
+                        return copy.deepcopy(response)
+
+            self.misses += 1
+            return None
+
+    def put(self, vector: np.ndarray, key, generation, response: dict) -> None:
+        if not self.capacity:
+            return
+
+        with self._lock:
+            self._check_generation(generation)
+            vector = self._prepare(vector)
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+
+            now = time.time()
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (key, copy.deepcopy(response), now)
+
+            expired = {i for i, (_, _, created) in self._entries.items() if now - created > self.ttl}
+            overflow = max(0, len(self._entries) - len(expired) - self.capacity)
+            oldest = [i for i in self._entries if i not in expired][:overflow]
+            if expired or oldest:
+                self.evictions += len(expired) + len(oldest)
+                self._remove([*expired, *oldest])
+
+    def _prepare(self, vector):
+        vector = np.array(vector, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _remove(self, entry_ids):
+        for entry_id in entry_ids:
+            del self._entries[entry_id]
+        self._index.remove_ids(np.array(entry_ids, dtype=np.int64))
+
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._index = None
+            self._entries.clear()
+            self._generation = generation
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index = None
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "generation": self._generation,
+            }
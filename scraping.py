@@ -1,20 +1,69 @@
 import requests
 from bs4 import BeautifulSoup
-import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+from urllib3.util.retry import Retry
+import argparse
 import csv
+import json
+import os
+import threading
+import time
 
-BASE_URL = "https://www.shl.com"
+BASE_URL = os.getenv("SHL_BASE_URL", "https://www.shl.com")
 HEADERS = {"User-Agent": "Mozilla/5.0"}
+OUTPUT_CSV = "shl_data_type1.csv"
+CHECKPOINT_PATH = "scrape_checkpoint.jsonl"   # rows finished in the current crawl
+HTTP_CACHE_PATH = "scrape_http_cache.json"    # ETag / Last-Modified + parsed detail per URL
+PAGE_SIZE = 12
+FIELDNAMES = [
+    "Assessment Name", "URL", "Remote Testing Support", "Adaptive Support", "IRT Support",
+    "Test Type(s)", "Duration", "Description", "Job Levels", "Languages"
+]
+EMPTY_DETAIL = {
+    "Test Type(s)": "N/A",
+    "Duration": "N/A",
+    "Description": "N/A",
+    "Job Levels": "N/A",
+    "Languages": "N/A"
+}
+
+
+# ⏱️ Per-host rate limit: requests to the same host are spaced at least
+# 1/rate seconds apart, shared across all worker threads.
+class HostRateLimiter:
+    def __init__(self, rate_per_host):
+        self.interval = 1.0 / rate_per_host if rate_per_host > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
 
-def get_soup(url):
-    response = requests.get(url, headers=HEADERS)
-    response.raise_for_status()
-    return BeautifulSoup(response.text, "html.parser")
 
-def parse_main_row(row):
+def make_session(pool_size):
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def parse_main_row(row, base_url=BASE_URL):
     name_tag = row.select_one("td.custom__table-heading__title a")
     name = name_tag.text.strip()
-    detail_url = BASE_URL + name_tag['href']
+    detail_url = base_url + name_tag['href']
 
     remote_support = "Yes" if row.select("td")[1].find(class_="-yes") else "No"
     adaptive_support = "Yes" if row.select("td")[2].find(class_="-yes") else "No"
@@ -34,80 +83,201 @@ def parse_main_row(row):
         "IRT Support": irt_support
     }
 
-def parse_detail_page(url):
-    try:
-        soup = get_soup(url)
-
-        def get_field(label):
-            tag = soup.find("h4", string=label)
-            if tag:
-                next_p = tag.find_next_sibling("p")
-                return next_p.text.strip() if next_p else "N/A"
-            return "N/A"
-
-        def get_test_type():
-            keys = soup.select("span.product-catalogue__key")
-            return ", ".join([k.text.strip() for k in keys]) if keys else "N/A"
-
-        duration = get_field("Assessment length")
-        if "Approximate Completion Time in minutes = " in duration:
-            duration = duration.replace("Approximate Completion Time in minutes = ", "")
-
-        return {
-            "Test Type(s)": get_test_type(),
-            "Duration": duration,
-            "Description": get_field("Description"),
-            "Job Levels": get_field("Job levels"),
-            "Languages": get_field("Languages")
-        }
-
-    except Exception as e:
-        print(f"❌ Error parsing detail page: {url} -> {e}")
-        return {
-            "Test Type(s)": "N/A",
-            "Duration": "N/A",
-            "Description": "N/A",
-            "Job Levels": "N/A",
-            "Languages": "N/A"
-        }
-
-def scrape_category():
-    start = 0
-    results = []
-
-    while True:
-        list_url = f"{BASE_URL}/solutions/products/product-catalog/?start={start}&type=1&type=1"
-        print(f"\n🔎 Scraping list page: {list_url}")
-        soup = get_soup(list_url)
-
-        rows = soup.select("tr[data-entity-id]")
-        if not rows:
-            print("✅ No more rows found.")
-            break
 
-        for row in rows:
-            row_data = parse_main_row(row)
-            print(f"   ↪ Visiting detail page: {row_data['URL']}")
-            detail_data = parse_detail_page(row_data["URL"])
-            row_data.update(detail_data)
-            results.append(row_data)
-            time.sleep(1)  # Be polite to server
+def parse_detail_html(html):
+    soup = BeautifulSoup(html, "html.parser")
+
+    def get_field(label):
+        tag = soup.find("h4", string=label)
+        if tag:
+            next_p = tag.find_next_sibling("p")
+            return next_p.text.strip() if next_p else "N/A"
+        return "N/A"
+
+    def get_test_type():
+        keys = soup.select("span.product-catalogue__key")
+        return ", ".join([k.text.strip() for k in keys]) if keys else "N/A"
+
+    duration = get_field("Assessment length")
+    if "Approximate Completion Time in minutes = " in duration:
+        duration = duration.replace("Approximate Completion Time in minutes = ", "")
+
+    return {
+        "Test Type(s)": get_test_type(),
+        "Duration": duration,
+        "Description": get_field("Description"),
+        "Job Levels": get_field("Job levels"),
+        "Languages": get_field("Languages")
+    }
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+# 🕷️ Concurrent, resumable crawler. List pages are walked in order while detail
+# pages are fetched by a thread pool over one pooled session. Finished rows are
+# appended to a checkpoint so an interrupted crawl resumes where it stopped, and
+# detail pages are revalidated with ETag / Last-Modified on later crawls.
+class CatalogScraper:
+    def __init__(self, base_url=BASE_URL, workers=8, rate_per_host=4.0,
+                 checkpoint_path=CHECKPOINT_PATH, http_cache_path=HTTP_CACHE_PATH):
+        self.base_url = base_url.rstrip("/")
+        self.workers = workers
+        self.session = make_session(workers)
+        self.limiter = HostRateLimiter(rate_per_host)
+        self.checkpoint_path = checkpoint_path
+        self.http_cache_path = http_cache_path
+        self._lock = threading.Lock()
+        self.http_cache = self._load_http_cache()
+        self.stats = {"fetched": 0, "not_modified": 0, "resumed": 0, "failed": 0}
+
+    def _load_http_cache(self):
+        if self.http_cache_path and os.path.exists(self.http_cache_path):
+            with open(self.http_cache_path, encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _load_checkpoint(self):
+        done = {}
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from an interrupted write
+                    done[row["URL"]] = row
+        return done
 
-        start += 12  # Move to next page
+    def _checkpoint(self, row):
+        if not self.checkpoint_path:
+            return
+        with self._lock:
+            with open(self.checkpoint_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row) + "\n")
+
+    def get(self, url, headers=None):
+        self.limiter.wait(url)
+        response = self.session.get(url, headers=headers, timeout=15)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    def get_soup(self, url):
+        return BeautifulSoup(self.get(url).text, "html.parser")
+
+    def fetch_detail(self, url):
+        with self._lock:
+            cached = self.http_cache.get(url)
+
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = self.get(url, headers=headers)
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self.stats["not_modified"] += 1
+            return cached["detail"]
+
+        detail = parse_detail_html(response.text)
+        with self._lock:
+            self.stats["fetched"] += 1
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                self.http_cache[url] = {"etag": etag, "last_modified": last_modified, "detail": detail}
+        return detail
+
+    def scrape_row(self, row_data):
+        print(f"   ↪ Visiting detail page: {row_data['URL']}")
+        try:
+            row_data.update(self.fetch_detail(row_data["URL"]))
+        except Exception as e:
+            print(f"❌ Error parsing detail page: {row_data['URL']} -> {e}")
+            with self._lock:
+                self.stats["failed"] += 1
+            row_data.update(EMPTY_DETAIL)
+            return row_data  # not checkpointed, so a resumed crawl retries it
+
+        self._checkpoint(row_data)
+        return row_data
+
+    def scrape_category(self):
+        done = self._load_checkpoint()
+        if done:
+            print(f"♻️ Resuming crawl: {len(done)} rows already in {self.checkpoint_path}")
+
+        futures = []
+        start = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                list_url = f"{self.base_url}/solutions/products/product-catalog/?start={start}&type=1&type=1"
+                print(f"\n🔎 Scraping list page: {list_url}")
+                soup = self.get_soup(list_url)
+
+                rows = soup.select("tr[data-entity-id]")
+                if not rows:
+                    print("✅ No more rows found.")
+                    break
+
+                for row in rows:
+                    row_data = parse_main_row(row, self.base_url)
+                    if row_data["URL"] in done:
+                        self.stats["resumed"] += 1
+                        futures.append(done[row_data["URL"]])
+                    else:
+                        futures.append(pool.submit(self.scrape_row, row_data))
+
+                start += PAGE_SIZE  # Move to next page
+
+            results = [f if isinstance(f, dict) else f.result() for f in futures]
+
+        if self.http_cache_path:
+            _write_json_atomic(self.http_cache_path, self.http_cache)
+        return results
+
+    def finish(self):
+        # The crawl completed, so the next one starts fresh (validators are kept)
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+
+def write_csv(data, path=OUTPUT_CSV):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        writer.writerows({k: row.get(k, "") for k in FIELDNAMES} for row in data)
+    os.replace(tmp_path, path)
 
-    return results
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape the SHL product catalogue (Type 1 assessments).")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=4.0, help="max requests per second per host")
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    args = parser.parse_args()
+
     print(f"\n🚀 Starting scrape for Type 1 assessments only")
-    data = scrape_category()
+    scraper = CatalogScraper(args.base_url, workers=args.workers, rate_per_host=args.rate)
+    data = scraper.scrape_category()
 
     if data:
-        keys = data[0].keys()
-        with open("shl_data_type1.csv", "w", newline="" , encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=keys)
-            writer.writeheader()
-            writer.writerows(data)
-
-        print(f"\n✅ Done! {len(data)} Type 1 records saved to 'shl_data_type1.csv'")
+        write_csv(data, args.output)
+        if not scraper.stats["failed"]:
+            scraper.finish()
+        print(f"\n✅ Done! {len(data)} Type 1 records saved to '{args.output}' {scraper.stats}")
     else:
         print("⚠️ No data was scraped.")
@@ -1,184 +1,766 @@
+import asyncio
 import faiss
-import pickle
 import numpy as np
-import re
 import os
-from sentence_transformers import SentenceTransformer
-from sklearn.preprocessing import normalize
-
-from gemini_booster import rewrite_query, rerank_results, generate_fallback, explain_reasoning
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from microbatch import MicroBatcher
+from catalog_columns import candidate_ids, compile_filters
+from query_filters import extract_filters
+from catalog_store import CATALOG_DIR, load_catalog
+from artifacts import current_generation, generation_file, generation_paths
+from bm25 import BM25_FILE, load_bm25
+from neighbours import load_neighbour_table, mmr
+from ann_index import INDEX_META_FILE, LEGACY_META, read_index_meta, search_parameters
+from normalization import get_normalizer
+from encoder import load_encoder
+from embedding_cache import QueryEmbeddingCache, QUERY_CACHE_CAPACITY, QUERY_CACHE_SPILL_PATH
+from result_cache import SemanticResultCache
+from gemini_booster import rewrite_query, generate_fallback, explain_results
+from llm_gating import LLM_GATING, decide_rerank, decide_rewrite, query_signals, score_gap
+from metrics import FALLBACK_RESPONSES, SEARCHES, STAGE_FALLBACKS, span, start_trace, start_usage
+from reranker import DEFAULT_RERANKER, cross_encoder, rerank
 
 # === Paths ===
+# Used only when no generation has been published under artifacts/
 INDEX_PATH = "faiss_index.index"
-MAPPING_PATH = "index_mapping.pkl"
-
-# === Load Model Safely ===
-try:
-    model = SentenceTransformer("local_model")
-except Exception as e:
-    print(f"[ERROR] Failed to load SentenceTransformer model: {e}")
-    model = None
+MAPPING_PATH = "index_mapping.pkl"  # legacy pickle, used only when CATALOG_DIR is missing
+RELOAD_CHECK_SECONDS = float(os.getenv("RELOAD_CHECK_SECONDS", "5"))
 
 # === Cache ===
-_index = None
-_metadata = None
-
-# === Preprocess Query ===
-def preprocess(text):
-    text = text.lower()
-    text = re.sub(r'[^a-z0-9\s]', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+# Index, catalog and encoder are loaded lazily (or by prewarm()) so importing
+# this module is cheap.
+_model = None
+_loaded = None  # (generation, index, catalog), swapped as a single tuple
+_last_reload_check = 0.0
+_reloading = None  # generation being read by the background reload thread
+_load_lock = threading.Lock()
+query_cache = QueryEmbeddingCache(QUERY_CACHE_CAPACITY, QUERY_CACHE_SPILL_PATH)
+result_cache = SemanticResultCache()
+
+# === Encode Queries (cached) ===
+# Texts arrive normalized with the loaded index's rules (see dense_search_many) and
+# double as cache keys. Only texts missing from the cache go through the transformer, in one batch.
+def encode_queries(keys):
+    vectors = [query_cache.get(k) for k in keys]
+
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        encoded = get_model().encode([keys[i] for i in missing], show_progress_bar=False)
+        for i, vector in zip(missing, encoded):
+            query_cache.put(keys[i], vector)
+            vectors[i] = vector
+
+    return np.vstack(vectors)
+
+# === Load Model ===
+def get_model():
+    global _model
+
+    if _model is None:
+        with _load_lock:
+            if _model is None:
+                _model = load_encoder()
+
+    return _model
 
 # === Load Index + Metadata ===
+def _read_artifacts(generation):
+    if generation:
+        index_path, catalog_dir = generation_paths(generation)
+        catalog = load_catalog(catalog_dir)
+        bm25_path = generation_file(generation, BM25_FILE)
+        if os.path.exists(bm25_path):
+            catalog.bm25 = load_bm25(bm25_path)
+        catalog.neighbours = load_neighbour_table(os.path.dirname(index_path))
+        catalog.index_meta = read_index_meta(generation_file(generation, INDEX_META_FILE))
+        catalog.generation = generation
+        get_normalizer(catalog.index_meta["normalization"])  # refuse an index this server cannot query
+        return faiss.read_index(index_path), catalog
+
+    if not os.path.exists(INDEX_PATH):
+        raise FileNotFoundError(f"FAISS index not found at {INDEX_PATH}")
+    catalog = load_catalog(CATALOG_DIR, MAPPING_PATH)
+    catalog.index_meta = dict(LEGACY_META)
+    return faiss.read_index(INDEX_PATH), catalog
+
+# Hot swap: every RELOAD_CHECK_SECONDS the published generation is compared with
+# the loaded one and, if it changed, a background thread reads the new index +
+# catalog while requests keep being served the old pair; the new pair replaces
+# it once fully loaded. Only the very first load blocks the caller; the search
+# pipeline asks for the pair through a "run" step, so async callers wait for it
+# in a worker thread.
 def load_index_and_metadata():
-    global _index, _metadata
-
-    if _index is None or _metadata is None:
-        if not os.path.exists(INDEX_PATH):
-            raise FileNotFoundError(f"FAISS index not found at {INDEX_PATH}")
-        if not os.path.exists(MAPPING_PATH):
-            raise FileNotFoundError(f"Mapping file not found at {MAPPING_PATH}")
+    global _loaded, _last_reload_check, _reloading
 
-        _index = faiss.read_index(INDEX_PATH)
-
-        with open(MAPPING_PATH, "rb") as f:
-            _metadata = pickle.load(f)
-
-    return _index, _metadata
-
-# === Filters Setup ===
-TEST_TYPE_MAP = {
-    "ability": "Ability & Aptitude",
-    "aptitude": "Ability & Aptitude",
-    "biodata": "Biodata & Situational Judgement",
-    "situational": "Biodata & Situational Judgement",
-    "competency": "Competencies",
-    "development": "Development & 360",
-    "exercise": "Assessment Exercises",
-    "skills": "Knowledge & Skills",
-    "knowledge": "Knowledge & Skills",
-    "personality": "Personality & Behavior",
-    "behavior": "Personality & Behavior",
-    "simulation": "Simulations"
-}
-DURATION_REGEX = re.compile(r"(\d+)\s*minutes?")
-JOB_LEVELS = ["entry", "mid", "senior", "executive", "graduate", "manager"]
+    loaded = _loaded
+    if loaded is not None and time.monotonic() - _last_reload_check < RELOAD_CHECK_SECONDS:
+        return loaded[1], loaded[2]
 
-def extract_filters_from_prompt(prompt):
-    prompt = prompt.lower()
-    filters = {}
+    with _load_lock:
+        _last_reload_check = time.monotonic()
+        generation = current_generation()
 
-    if match := DURATION_REGEX.search(prompt):
-        filters["max_duration"] = int(match.group(1))
+        if _loaded is None:
+            _loaded = (generation, *_read_artifacts(generation))
+        elif _loaded[0] != generation and _reloading is None:
+            _reloading = generation
+            threading.Thread(target=_reload, args=(generation,), name="index-reload", daemon=True).start()
 
-    filters["job_levels"] = [level for level in JOB_LEVELS if level in prompt]
+        return _loaded[1], _loaded[2]
 
-    filters["test_types"] = [
-        decoded for key, decoded in TEST_TYPE_MAP.items() if key in prompt
-    ]
+def _reload(generation):
+    global _loaded, _reloading
+    try:
+        artifacts = _read_artifacts(generation)
+        with _load_lock:
+            _loaded = (generation, *artifacts)
+        print(f"🔄 Hot-swapped to index generation {generation}")
+    except Exception as e:
+        print(f"[WARN] Could not load generation {generation}, keeping {_loaded[0]}: {e}")
+    finally:
+        _reloading = None
 
-    return filters
+# === Prewarm ===
+# Loads everything a request needs and runs one dummy encode + search so the
+# first real request does not pay for it. Returns per-step timings in seconds.
+def prewarm():
+    timings = {}
 
-def passes_filters(record, filters):
-    try:
-        duration_str = str(record.get("Duration", "")).split()
-        duration_val = int(duration_str[0]) if duration_str else None
-    except:
-        duration_val = None
+    start = time.perf_counter()
+    index, _ = load_index_and_metadata()
+    timings["load_index"] = time.perf_counter() - start
 
-    if "max_duration" in filters and duration_val and duration_val > filters["max_duration"]:
-        return False
+    start = time.perf_counter()
+    encoder = get_model()
+    timings["load_model"] = time.perf_counter() - start
 
-    if filters.get("job_levels"):
-        jl = str(record.get("Job Levels", "")).lower()
-        if not any(level in jl for level in filters["job_levels"]):
-            return False
+    start = time.perf_counter()
+    index.search(encoder.encode(["warmup hiring query"]), 1)
+    timings["warmup_search"] = time.perf_counter() - start
 
-    if filters.get("test_types"):
-        tt = str(record.get("Decoded Test Type(s)", "")).lower()
-        if not any(t.lower() in tt for t in filters["test_types"]):
-            return False
+    if DEFAULT_RERANKER == "cross-encoder":
+        start = time.perf_counter()
+        cross_encoder.warmup()
+        timings["load_reranker"] = time.perf_counter() - start
 
-    return True
+    return timings
 
-# === Main Search ===
-def search(query, top_k=10, debug=False, include_explanations=False, do_rerank=True):
+# === Filters Setup ===
+# Durations, job levels, test types, languages and remote / adaptive / IRT
+# support; see query_filters for the phrase tables
+def extract_filters_from_prompt(prompt):
+    return extract_filters(prompt)
+
+# === Stage Deadlines (async path) ===
+REWRITE_TIMEOUT = float(os.getenv("REWRITE_TIMEOUT", "4"))
+RERANK_TIMEOUT = float(os.getenv("RERANK_TIMEOUT", "6"))
+EXPLAIN_TIMEOUT = float(os.getenv("EXPLAIN_TIMEOUT", "8"))
+FALLBACK_TIMEOUT = float(os.getenv("FALLBACK_TIMEOUT", "4"))
+
+DEFAULT_FALLBACK = "Sorry, no matching assessments were found. Please try rephrasing your input."
+DEFAULT_EXPLANATION = "This assessment aligns well with the job requirements based on type, level, and content."
+
+MICROBATCH_WINDOW_MS = float(os.getenv("MICROBATCH_WINDOW_MS", "0"))  # 0 disables micro-batching
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "32"))
+
+# === Hybrid Retrieval ===
+DENSE_WEIGHT = float(os.getenv("DENSE_WEIGHT", "1.0"))
+LEXICAL_WEIGHT = float(os.getenv("LEXICAL_WEIGHT", "1.0"))  # 0 disables BM25 fusion
+FUSION_DEPTH = int(os.getenv("FUSION_DEPTH", "50"))
+RRF_K = 60
+
+# === Diversification ===
+# MMR over the candidate pool with the precomputed neighbour table, so
+# near-identical variants (regional copies of one assessment) do not fill the top-k
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1 disables diversification
+
+def diversify(ranked, metadata, top_k, lam=MMR_LAMBDA):
+    positions = [int(metadata.id_to_row[row_id]) for row_id in ranked]
+    return [int(metadata.row_ids[p]) for p in mmr(positions, metadata.neighbours, top_k, lam)]
+
+# Weighted reciprocal rank fusion over rankings of row ids
+def fuse_rankings(rankings, weights, k=RRF_K):
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        if weight <= 0:
+            continue
+        for rank, row_id in enumerate(ranking):
+            scores[row_id] = scores.get(row_id, 0.0) + weight / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True), scores
+
+# === Long Query Chunking ===
+# MiniLM truncates at max_seq_length (256 word pieces), so a pasted job posting
+# is split into overlapping word windows (~160 normalized words stay under the
+# limit). Every chunk is searched and the per-assessment results are aggregated:
+#   max - best chunk score, sum - total similarity over chunks, rrf - rank fusion
+CHUNK_WORDS = int(os.getenv("CHUNK_WORDS", "160"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "40"))
+MAX_CHUNKS = int(os.getenv("MAX_CHUNKS", "32"))
+CHUNK_AGGREGATION = os.getenv("CHUNK_AGGREGATION", "rrf")  # max | sum | rrf
+
+def chunk_text(text, size=CHUNK_WORDS, overlap=CHUNK_OVERLAP, max_chunks=MAX_CHUNKS):
+    words = text.split()
+    if len(words) <= size:
+        return [text]
+
+    step = max(size - overlap, 1)
+    chunks = [" ".join(words[i:i + size]) for i in range(0, len(words) - overlap, step)]
+    if len(chunks) > max_chunks:
+        # Very long pages: keep evenly spaced windows so the whole text is still sampled
+        keep = np.linspace(0, len(chunks) - 1, max_chunks).round().astype(int)
+        chunks = [chunks[i] for i in keep]
+    return chunks
+
+# Per-chunk hits are {row_id: raw FAISS score}; returns the aggregated ranking
+# and the best raw score per row id (kept as the record's "Score").
+def aggregate_chunk_hits(chunk_hits, higher_is_better, method=CHUNK_AGGREGATION):
+    if len(chunk_hits) == 1:
+        return list(chunk_hits[0]), chunk_hits[0]
+
+    pick = max if higher_is_better else min
+    best, total = {}, {}
+    for hits in chunk_hits:
+        for row_id, score in hits.items():
+            best[row_id] = pick(best[row_id], score) if row_id in best else score
+            total[row_id] = total.get(row_id, 0.0) + (score if higher_is_better else -score)
+
+    if method == "rrf":
+        ranked, _ = fuse_rankings([list(hits) for hits in chunk_hits], [1.0] * len(chunk_hits))
+    elif method == "sum":
+        ranked = sorted(total, key=total.get, reverse=True)
+    elif method == "max":
+        ranked = sorted(best, key=best.get, reverse=higher_is_better)
+    else:
+        raise ValueError(f"Unknown chunk aggregation: {method}. Choose max, sum or rrf")
+    return ranked, best
+
+# === Dense Retrieval ===
+# Filters are resolved against the precomputed catalog columns into a candidate
+# id set before the vector scan, so FAISS returns the top-k matching rows.
+# Queries sharing the same filters are searched together in one multi-row call.
+# The index type (and its efSearch / nprobe) comes from the generation's index_meta.
+# Long queries contribute one row per chunk to the same FAISS call.
+def _search_candidates(index, query_embeddings, top_k, ids, meta=LEGACY_META):
+    if ids is None:
+        return index.search(query_embeddings, top_k, params=search_parameters(meta, k=top_k))
+
+    k = min(top_k, len(ids))
+    if k == 0:
+        empty = np.empty((len(query_embeddings), 0))
+        return empty, empty.astype(np.int64)
+
+    selector = faiss.IDSelectorBatch(ids)
+    return index.search(query_embeddings, k, params=search_parameters(meta, selector, k))
+
+def dense_search_many(rewritten_queries, top_k, index, metadata, debug=False,
+                      dense_weight=None, lexical_weight=None):
+    dense_weight = DENSE_WEIGHT if dense_weight is None else dense_weight
+    lexical_weight = LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+    hybrid = metadata.bm25 is not None and lexical_weight > 0
+    diverse = metadata.neighbours is not None and MMR_LAMBDA < 1
+    depth = max(top_k, FUSION_DEPTH) if hybrid or diverse else top_k
+
+    with span("filter"):
+        all_filters = [extract_filters_from_prompt(q) for q in rewritten_queries]
+        groups = {}
+        for row, filters in enumerate(all_filters):
+            groups.setdefault(compile_filters(filters), []).append(row)
+    if debug:
+        for filters in all_filters:
+            print("🔍 Extracted Filters:", filters)
+
+    normalize = get_normalizer(metadata.index_meta["normalization"])
+    higher_is_better = metadata.index_meta["metric"] == "inner_product"
+    with span("encode"):
+        normalized_queries = [normalize(q) for q in rewritten_queries]
+        query_chunks = [chunk_text(q) for q in normalized_queries]
+        chunk_offsets = np.cumsum([0] + [len(chunks) for chunks in query_chunks])
+        chunk_embeddings = encode_queries([c for chunks in query_chunks for c in chunks])
+    if debug:
+        for chunks in query_chunks:
+            if len(chunks) > 1:
+                print(f"✂️ Long query split into {len(chunks)} chunks ({CHUNK_AGGREGATION} aggregation)")
+
+    batch_results = [[] for _ in rewritten_queries]
+    for rows in groups.values():
+        with span("filter"):
+            positions = candidate_ids(metadata.columns, all_filters[rows[0]])
+            ids = metadata.row_ids[positions] if positions is not None else None
+        chunk_rows = np.concatenate([np.arange(chunk_offsets[r], chunk_offsets[r + 1]) for r in rows])
+        with span("vector_search"):
+            distances, indices = _search_candidates(index, chunk_embeddings[chunk_rows], depth, ids,
+                                                    metadata.index_meta)
+
+        cursor = 0
+        for row in rows:
+            chunk_hits = []
+            for i in range(cursor, cursor + len(query_chunks[row])):
+                hits = {}
+                for idx, score in zip(indices[i], distances[i]):
+                    if 0 <= idx < len(metadata.id_to_row) and metadata.id_to_row[idx] >= 0:
+                        hits[int(idx)] = float(score)
+                chunk_hits.append(hits)
+            cursor += len(query_chunks[row])
+
+            fused = None
+            ranked, dense_hits = aggregate_chunk_hits(chunk_hits, higher_is_better)
+            if hybrid:
+                with span("lexical"):
+                    lexical_positions, _ = metadata.bm25.top(normalized_queries[row], depth, positions)
+                lexical_ids = metadata.row_ids[lexical_positions].tolist()
+                ranked, fused = fuse_rankings([ranked, lexical_ids], [dense_weight, lexical_weight])
+            if diverse:
+                with span("diversify"):
+                    ranked = diversify(ranked, metadata, top_k)
+
+            results = []
+            for row_id in ranked[:top_k]:
+                record = metadata.record(metadata.id_to_row[row_id])
+                record["Assessment ID"] = int(row_id)
+                record["Score"] = dense_hits.get(row_id)  # L2 distance or cosine per index_meta, None if lexical-only
+                if fused is not None:
+                    record["Fusion Score"] = fused[row_id]
+                results.append(record)
+            batch_results[row] = results
+
+    return batch_results
+
+def dense_search(rewritten_query, top_k, index, metadata, debug=False, dense_weight=None, lexical_weight=None):
+    return dense_search_many([rewritten_query], top_k, index, metadata, debug=debug,
+                             dense_weight=dense_weight, lexical_weight=lexical_weight)[0]
+
+# Micro-batch items are (query, top_k, dense_weight, lexical_weight); items that
+# share fusion weights are searched together.
+def _dense_search_batch(items):
+    index, metadata = load_index_and_metadata()
+    groups = {}
+    for position, (_, _, dense_weight, lexical_weight) in enumerate(items):
+        groups.setdefault((dense_weight, lexical_weight), []).append(position)
+
+    outputs = [None] * len(items)
+    for (dense_weight, lexical_weight), positions in groups.items():
+        top_k = max(items[p][1] for p in positions)
+        batch_results = dense_search_many([items[p][0] for p in positions], top_k, index, metadata,
+                                          dense_weight=dense_weight, lexical_weight=lexical_weight)
+        for p, results in zip(positions, batch_results):
+            outputs[p] = results[:items[p][1]]
+    return outputs
+
+_batcher = None
+
+def _get_batcher():
+    global _batcher
+    if _batcher is None:
+        _batcher = MicroBatcher(_dense_search_batch, MICROBATCH_WINDOW_MS, MICROBATCH_MAX_SIZE)
+    return _batcher
+
+def _load_or_error(query):
     try:
         index, metadata = load_index_and_metadata()
     except Exception as e:
         print(f"[ERROR] Index/Metadata load failed: {e}")
-        return {
+        return None, None, {
             "rewritten_query": query,
             "results": [],
             "fallback": f"Could not load index or metadata: {e}"
         }
 
-    if not model:
-        return {
+    try:
+        get_model()
+    except Exception as e:
+        print(f"[ERROR] Failed to load encoder model: {e}")
+        return None, None, {
             "rewritten_query": query,
             "results": [],
-            "fallback": "SentenceTransformer model not loaded."
+            "fallback": "Encoder model not loaded."
         }
 
-    rewritten_query = rewrite_query(query)
-    if debug:
-        print(f"📝 Rewritten Query: {rewritten_query}")
-
-    filters = extract_filters_from_prompt(rewritten_query)
-    if debug:
-        print("🔍 Extracted Filters:", filters)
-
+    return index, metadata, None
+
+# === Result Cache ===
+# Near-duplicate queries ("Java developer 40 mins" / "java dev, 40 minutes") reuse
+# the final response of an earlier search, skipping the rewrite, rerank and
+# explanation calls. The key holds the extracted filters and every option that
+# changes the response. Responses where an LLM stage fell back are not stored.
+# Queries long enough to be chunked (pasted job descriptions) bypass the cache:
+# one vector is truncated by the encoder, so two postings sharing a long intro
+# would look identical.
+def _result_cache_probe(query, metadata, *options):
+    if not result_cache.capacity:
+        return None, None, None
+    normalize = get_normalizer(metadata.index_meta["normalization"])
+    text = normalize(query)
+    if len(chunk_text(text)) > 1:
+        return None, None, None
+    vector = encode_queries([text])[0]
+    key = (compile_filters(extract_filters_from_prompt(query)), *options)
+    return vector, key, result_cache.get(vector, key, metadata.generation)
+
+def _result_cache_store(vector, key, metadata, response):
+    if vector is not None and response["results"]:
+        result_cache.put(vector, key, metadata.generation, response)
+
+# === Adaptive LLM Gating ===
+# In auto mode the raw query is searched first (milliseconds) and local signals
+# decide whether the Gemini rewrite and rerank are worth their latency. The
+# decisions are returned as "gating" and counted in /metrics.
+def _gating_signals(query, results, metadata):
+    return query_signals(query, extract_filters_from_prompt(query), results,
+                         metadata.index_meta["metric"], metadata.bm25)
+
+def _gate_rerank(gate, results, metadata, reranker):
+    gate["rerank"] = decide_rerank(gate["mode"], score_gap(results, metadata.index_meta["metric"]), reranker)
+    return gate["rerank"]["call"]
+
+def _retrieve(text, top_k, index, metadata, debug, dense_weight, lexical_weight):
     try:
-        query_embedding = model.encode([preprocess(rewritten_query)], show_progress_bar=False)
-        query_embedding = normalize(query_embedding, axis=1)
-        distances, indices = index.search(query_embedding, top_k * 5)
+        return dense_search(text, top_k, index, metadata, debug=debug,
+                            dense_weight=dense_weight, lexical_weight=lexical_weight)
     except Exception as e:
         print(f"[ERROR] FAISS search failed: {e}")
-        return {
-            "rewritten_query": rewritten_query,
-            "results": [],
-            "fallback": generate_fallback(query)
-        }
-
-    results = []
-    for idx, score in zip(indices[0], distances[0]):
-        if idx >= len(metadata):
-            continue
-        record = metadata[idx].copy()
-        record["Score"] = float(score)
+        return []
 
-        if passes_filters(record, filters):
-            record.pop("Decoded Test Type(s)", None)
-            results.append(record)
+async def _retrieve_async(text, top_k, index, metadata, debug, dense_weight, lexical_weight):
+    try:
+        if MICROBATCH_WINDOW_MS > 0:
+            return await _get_batcher().submit((text, top_k, dense_weight, lexical_weight))
+        return await asyncio.to_thread(dense_search, text, top_k, index, metadata, debug,
+                                       dense_weight, lexical_weight)
+    except Exception as e:
+        print(f"[ERROR] FAISS search failed: {e}")
+        return []
+
+# === Search Pipeline ===
+# One stage sequence serves search, search_async and search_stream. _pipeline is
+# a generator that yields operations and is sent their results, so each entry
+# point only decides how to run them:
+#   ("run", func, args)                 local work; async runs it in a worker thread
+#   ("retrieve", args)                  hybrid retrieval (_retrieve arguments)
+#   ("llm", name, timeout, func, args)  an LLM stage; None is sent back when it
+#                                       failed or missed its deadline
+#   ("event", event)                    progress for search_stream; the others skip it
+# The generator returns the final response. A response where any LLM stage fell
+# back is marked degraded and never stored in the result cache.
+def _pipeline(query, top_k, debug, include_explanations, do_rerank, dense_weight, lexical_weight,
+              reranker, gating, progressive=False):
+    index, metadata, error = yield ("run", _load_or_error, (query,))
+    if error:
+        yield ("event", dict(error, event="fallback"))
+        return error
+
+    with span("result_cache"):
+        vector, cache_key, cached = yield ("run", _result_cache_probe,
+                                           (query, metadata, top_k, include_explanations, do_rerank,
+                                            dense_weight, lexical_weight, reranker, gating))
+    if cached is not None:
+        if debug:
+            print("♻️ Served from result cache")
+        yield ("event", dict(cached, event="results", stage="cached", from_cache=True))
+        return dict(cached, from_cache=True)
+    degraded = False
+
+    def retrieve(text):
+        return ("retrieve", (text, top_k, index, metadata, debug, dense_weight, lexical_weight))
+
+    # Auto gating needs the raw query's results for its signals; the stream
+    # always shows them first
+    gate = {"mode": gating}
+    results = None
+    if gating == "auto" or progressive:
+        results = yield retrieve(query)
+        if results:
+            yield ("event", {"event": "results", "stage": "dense", "rewritten_query": query, "results": results})
+    if gating == "auto":
+        gate["signals"] = _gating_signals(query, results, metadata)
+    gate["rewrite"] = decide_rewrite(gating, gate.get("signals"))
+
+    rewritten_query = query
+    if gate["rewrite"]["call"]:
+        with span("rewrite"):
+            rewritten_query = yield ("llm", "Rewrite", REWRITE_TIMEOUT, rewrite_query, (query,))
+        degraded = rewritten_query is None
+        rewritten_query = rewritten_query or query
+    if debug:
+        print(f"📝 Rewritten Query: {rewritten_query}")
 
-        if len(results) >= top_k:
-            break
+    if results is None or rewritten_query != query:
+        results = yield retrieve(rewritten_query)
+        if results and rewritten_query != query:
+            yield ("event", {"event": "results", "stage": "rewritten", "rewritten_query": rewritten_query,
+                             "results": results})
 
     if not results:
-        return {
+        with span("fallback"):
+            fallback = yield ("llm", "Fallback", FALLBACK_TIMEOUT, generate_fallback, (query,))
+        response = {
             "rewritten_query": rewritten_query,
             "results": [],
-            "fallback": generate_fallback(query)
+            "fallback": fallback or DEFAULT_FALLBACK,
+            "gating": gate
         }
-
-    if do_rerank:
-        try:
-            results = rerank_results(rewritten_query, results)
-        except Exception as e:
-            print(f"[WARN] Rerank failed: {e}")
+        yield ("event", dict(response, event="fallback"))
+        return response
+
+    if do_rerank and _gate_rerank(gate, results, metadata, reranker):
+        with span("rerank"):
+            reranked = yield ("llm", "Rerank", RERANK_TIMEOUT, rerank, (rewritten_query, results, reranker))
+        degraded = degraded or reranked is None
+        if reranked is not None:
+            results = reranked[:top_k]
+            yield ("event", {"event": "results", "stage": "reranked", "rewritten_query": rewritten_query,
+                             "results": results})
+    results = results[:top_k]
 
     if include_explanations:
-        for r in results:
-            try:
-                r["LLM Explanation"] = explain_reasoning(rewritten_query, r)
-            except Exception as e:
-                r["LLM Explanation"] = f"Error generating explanation: {e}"
+        with span("explain"):
+            explanations = yield ("llm", "Explain", EXPLAIN_TIMEOUT, explain_results, (rewritten_query, results))
+        degraded = degraded or explanations is None
+        _apply_explanations(results, explanations)
+        for i, r in enumerate(results):
+            yield ("event", {"event": "explanation", "index": i, "url": r.get("URL", ""),
+                             "explanation": r["LLM Explanation"]})
 
-    return {
+    if debug:
+        print(f"🚦 LLM gating: {gate}")
+    response = {
         "rewritten_query": rewritten_query,
-        "results": results[:top_k]
+        "results": results,
+        "gating": gate
     }
+    if not degraded:
+        yield ("run", _result_cache_store, (vector, cache_key, metadata, response))
+    return response
+
+# All explanations come from one batched Gemini call; results it skipped, or
+# every result when the call failed, get the generic explanation.
+def _apply_explanations(results, explanations):
+    for r, text in zip(results, explanations or [None] * len(results)):
+        r["LLM Explanation"] = text or DEFAULT_EXPLANATION
+
+# Runs the pipeline in the calling thread, yielding its events and returning
+# the response. run_llm(name, timeout, func, args) executes the LLM stages.
+def _run_pipeline(pipeline, run_llm):
+    result = None
+    while True:
+        try:
+            op = pipeline.send(result)
+        except StopIteration as stop:
+            return stop.value
+        result = None
+        if op[0] == "event":
+            yield op[1]
+        elif op[0] == "run":
+            result = op[1](*op[2])
+        elif op[0] == "retrieve":
+            result = _retrieve(*op[1])
+        else:
+            result = run_llm(*op[1:])
+
+def _drain(events):
+    try:
+        while True:
+            next(events)
+    except StopIteration as stop:
+        return stop.value
+
+# Stage timings and LLM token counts always feed /metrics; with debug=True they
+# are also returned in the response as timings_ms and llm_usage.
+def _finish(response, path, debug, trace, usage):
+    response.setdefault("from_cache", False)
+    if not response["results"]:
+        FALLBACK_RESPONSES.inc(path=path)
+    if debug:
+        response["timings_ms"] = trace
+        response["llm_usage"] = usage
+    return response
+
+# === Main Search ===
+# LLM stages run inline without deadlines; a failing stage falls back to the
+# non-LLM result.
+def _call_stage(name, timeout, func, args):
+    try:
+        return func(*args)
+    except Exception as e:
+        print(f"[WARN] {name} failed: {e}")
+        STAGE_FALLBACKS.inc(stage=name.lower(), reason="error")
+    return None
+
+def search(query, top_k=10, debug=False, include_explanations=False, do_rerank=True,
+           dense_weight=None, lexical_weight=None, reranker=None, gating=None):
+    SEARCHES.inc(path="sync")
+    with start_trace() as trace, start_usage() as usage:
+        with span("total"):
+            pipeline = _pipeline(query, top_k, debug, include_explanations, do_rerank,
+                                 dense_weight, lexical_weight, reranker, gating or LLM_GATING)
+            response = _drain(_run_pipeline(pipeline, _call_stage))
+    return _finish(response, "sync", debug, trace, usage)
+
+# === Async Search ===
+# Gemini calls are blocking, so each one runs in a worker thread under its own
+# deadline. A stage that times out or fails falls back to the non-LLM result.
+async def _run_stage(name, timeout, default, func, *args):
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(func, *args), timeout)
+    except asyncio.TimeoutError:
+        print(f"[WARN] {name} timed out after {timeout}s, using fallback")
+        STAGE_FALLBACKS.inc(stage=name.lower(), reason="timeout")
+    except Exception as e:
+        print(f"[WARN] {name} failed: {e}")
+        STAGE_FALLBACKS.inc(stage=name.lower(), reason="error")
+    return default
+
+async def _run_pipeline_async(pipeline):
+    result = None
+    while True:
+        try:
+            op = pipeline.send(result)
+        except StopIteration as stop:
+            return stop.value
+        result = None
+        if op[0] == "run":
+            result = await asyncio.to_thread(op[1], *op[2])
+        elif op[0] == "retrieve":
+            result = await _retrieve_async(*op[1])
+        elif op[0] == "llm":
+            name, timeout, func, args = op[1:]
+            result = await _run_stage(name, timeout, None, func, *args)
+
+async def search_async(query, top_k=10, debug=False, include_explanations=False, do_rerank=True,
+                       dense_weight=None, lexical_weight=None, reranker=None, gating=None):
+    SEARCHES.inc(path="async")
+    with start_trace() as trace, start_usage() as usage:
+        with span("total"):
+            pipeline = _pipeline(query, top_k, debug, include_explanations, do_rerank,
+                                 dense_weight, lexical_weight, reranker, gating or LLM_GATING)
+            response = await _run_pipeline_async(pipeline)
+    return _finish(response, "async", debug, trace, usage)
+
+# === Streaming Search ===
+# Yields events as each stage completes so callers can render the dense top-k
+# within milliseconds instead of waiting on every Gemini call:
+#   {"event": "results", "stage": "dense" | "rewritten" | "reranked", "rewritten_query", "results"}
+#   {"event": "results", "stage": "cached", "rewritten_query", "results", "from_cache": true}
+#   {"event": "explanation", "index", "url", "explanation"}   (index into the last results)
+#   {"event": "fallback", "rewritten_query", "fallback"}
+#   {"event": "done", "elapsed_ms", "gating", "llm_usage"}
+# The dense stage searches the raw query; the rewrite only triggers a second
+# (cheap) vector search when it actually changes the query. LLM stages keep
+# the same deadlines and gating as search_async.
+STREAM_WORKERS = int(os.getenv("STREAM_WORKERS", "16"))
+_stage_pool = ThreadPoolExecutor(max_workers=STREAM_WORKERS, thread_name_prefix="search-stage")
+
+# Pool threads do not inherit the caller's context, so the stream's token usage
+# dict is bound explicitly around each stage
+def _with_usage(usage, func, *args):
+    with start_usage(usage):
+        return func(*args)
+
+def _call_with_deadline(name, timeout, default, func, *args, usage=None):
+    future = _stage_pool.submit(_with_usage, usage, func, *args)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        print(f"[WARN] {name} timed out after {timeout}s, using fallback")
+        STAGE_FALLBACKS.inc(stage=name.lower(), reason="timeout")
+    except Exception as e:
+        print(f"[WARN] {name} failed: {e}")
+        STAGE_FALLBACKS.inc(stage=name.lower(), reason="error")
+    return default
+
+def search_stream(query, top_k=10, debug=False, include_explanations=False, do_rerank=True,
+                  dense_weight=None, lexical_weight=None, reranker=None, gating=None):
+    SEARCHES.inc(path="stream")
+    start = time.perf_counter()
+    usage = {}
+
+    def run_llm(name, timeout, func, args):
+        return _call_with_deadline(name, timeout, None, func, *args, usage=usage)
+
+    pipeline = _pipeline(query, top_k, debug, include_explanations, do_rerank, dense_weight, lexical_weight,
+                         reranker, gating or LLM_GATING, progressive=True)
+    response = yield from _run_pipeline(pipeline, run_llm)
+    if not response["results"]:
+        FALLBACK_RESPONSES.inc(path="stream")
+    yield {"event": "done", "elapsed_ms": (time.perf_counter() - start) * 1000.0,
+           "gating": response.get("gating"), "llm_usage": usage}
+
+# === Similar Assessments ===
+# Served from the neighbour table precomputed by embedding.py: no encoder, no
+# FAISS search, no LLM. assessment_id is the stable row id ("Assessment ID" in
+# search results). Returns None for an unknown id.
+def similar_assessments(assessment_id, top_k=10, filters=None):
+    _, metadata = load_index_and_metadata()
+    if metadata.neighbours is None:
+        raise RuntimeError("This index generation has no neighbour table; rebuild it with `python embedding.py`")
+    if not 0 <= assessment_id < len(metadata.id_to_row) or metadata.id_to_row[assessment_id] < 0:
+        return None
+
+    position = int(metadata.id_to_row[assessment_id])
+    with span("similar"):
+        rows, scores = metadata.neighbours.similar(position, top_k, metadata.columns, filters)
+
+    assessment = metadata.record(position)
+    assessment["Assessment ID"] = assessment_id
+    results = []
+    for row, score in zip(rows.tolist(), scores.tolist()):
+        record = metadata.record(row)
+        record["Assessment ID"] = int(metadata.row_ids[row])
+        record["Similarity"] = score
+        results.append(record)
+    return {"assessment": assessment, "results": results}
+
+# === Batch Search ===
+# Local-only by default: the LLM rewrite and rerank stages are opt-in so a batch
+# costs one encoder pass and one FAISS call.
+def search_many(queries, top_k=10, debug=False, do_rewrite=False, do_rerank=False,
+                dense_weight=None, lexical_weight=None, reranker=None):
+    SEARCHES.inc(len(queries), path="batch")
+    index, metadata, error = _load_or_error("")
+    if error:
+        FALLBACK_RESPONSES.inc(len(queries), path="batch")
+        return [dict(error, rewritten_query=q) for q in queries]
+
+    if do_rewrite:
+        with span("rewrite"):
+            rewritten_queries = [_call_stage("Rewrite", None, rewrite_query, (q,)) or q for q in queries]
+    else:
+        rewritten_queries = list(queries)
+
+    try:
+        batch_results = dense_search_many(rewritten_queries, top_k, index, metadata, debug=debug,
+                                          dense_weight=dense_weight, lexical_weight=lexical_weight)
+    except Exception as e:
+        print(f"[ERROR] FAISS batch search failed: {e}")
+        batch_results = [[] for _ in queries]
+
+    responses = []
+    for rewritten_query, results in zip(rewritten_queries, batch_results):
+        if not results:
+            FALLBACK_RESPONSES.inc(path="batch")
+            responses.append({
+                "rewritten_query": rewritten_query,
+                "results": [],
+                "fallback": DEFAULT_FALLBACK
+            })
+            continue
+
+        if do_rerank:
+            with span("rerank"):
+                try:
+                    results = rerank(rewritten_query, results, reranker) or results
+                except Exception as e:
+                    print(f"[WARN] Rerank failed: {e}")
+                    STAGE_FALLBACKS.inc(stage="rerank", reason="error")
+
+        responses.append({
+            "rewritten_query": rewritten_query,
+            "results": results[:top_k]
+        })
+
+    return responses
 
 # === CLI Debug Mode ===
 if __name__ == "__main__":
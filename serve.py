@@ -0,0 +1,184 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Thread pools must not exist before fork(): encoders and FAISS start single
+# threaded in the parent, and each worker raises its own thread count after forking.
+os.environ.setdefault("ENCODER_THREADS", "1")
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+import metrics
+from metrics import process_memory
+
+# === Settings ===
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "2"))
+THREADS_PER_WORKER = int(os.getenv("THREADS_PER_WORKER", "1"))
+PORT = int(os.getenv("PORT", 8000))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # worker slot i serves /metrics on METRICS_PORT + i; 0 = off
+REPORT_AFTER_SECONDS = 10.0
+
+
+# 🚀 Pre-fork server. The parent loads the FAISS index, the memory-mapped catalog
+# and the encoder weights once, then forks the uvicorn workers. Those pages are
+# never written after loading, so the workers share them copy-on-write and each
+# worker only adds its own request-handling memory.
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload():
+    import faiss
+    faiss.omp_set_num_threads(1)
+
+    import api
+    api.PREWARM = False  # already warm when the workers start
+    api.prewarm()
+
+    # Objects created during loading move to the permanent generation so the
+    # collector in each worker never touches (and un-shares) their pages.
+    gc.collect()
+    gc.freeze()
+    return api
+
+
+# 📊 Metrics live in each worker's memory, and /metrics on the shared port is
+# answered by whichever worker accepts the connection. Prometheus should scrape
+# every worker on its own port instead (one target per slot) and sum across the
+# worker label.
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(host, port):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📊 Worker {os.getpid()} metrics on {host}:{port}")
+
+
+def run_worker(api, sock, threads, host, slot):
+    import faiss
+    import uvicorn
+
+    faiss.omp_set_num_threads(threads)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+    if METRICS_PORT:
+        serve_metrics(host, METRICS_PORT + slot)
+
+    config = uvicorn.Config(api.app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+# A restarted worker takes over the slot (and metrics port) of the one it replaces
+def spawn_worker(api, sock, threads, host, slot):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            os.environ["METRICS_WORKER"] = str(slot)
+            run_worker(api, sock, threads, host, slot)
+        except Exception as e:
+            print(f"[ERROR] Worker {os.getpid()} crashed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def memory_report(workers):
+    parent = process_memory()
+    if not parent:
+        print("⚠️ Memory report needs /proc/<pid>/smaps_rollup (Linux)")
+        return
+
+    mb = 1024 * 1024
+    print(f"\n🧠 Memory (MB)  parent rss={parent['rss'] / mb:.1f}")
+    total_private = 0
+    for pid in sorted(workers):
+        usage = process_memory(pid)
+        if not usage:
+            continue
+        total_private += usage["private"]
+        print(f"   worker {pid}: rss={usage['rss'] / mb:.1f} pss={usage['pss'] / mb:.1f} "
+              f"private={usage['private'] / mb:.1f} shared={usage['shared'] / mb:.1f}")
+    print(f"   per-worker incremental (avg private): {total_private / max(len(workers), 1) / mb:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve api:app from forked workers sharing one loaded index and model.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--threads", type=int, default=THREADS_PER_WORKER, help="torch / FAISS threads per worker")
+    args = parser.parse_args()
+
+    sock = bind_socket(args.host, args.port)
+    start = time.perf_counter()
+    api = preload()
+    print(f"📦 Preloaded index, catalog and encoder in {time.perf_counter() - start:.2f}s")
+
+    workers = {spawn_worker(api, sock, args.threads, args.host, slot): slot for slot in range(args.workers)}
+    print(f"👷 Started {len(workers)} workers on {args.host}:{args.port}: {sorted(workers)}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    report_at = time.monotonic() + REPORT_AFTER_SECONDS
+
+    def request_report(signum, frame):
+        nonlocal report_at
+        report_at = time.monotonic()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, request_report)  # kill -USR1 <parent> prints the memory report again
+
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            slot = workers.pop(pid, None)
+            if not stopping and slot is not None:
+                print(f"[WARN] Worker {pid} exited with status {status}, restarting")
+                workers[spawn_worker(api, sock, args.threads, args.host, slot)] = slot
+            continue
+
+        if report_at and time.monotonic() >= report_at:
+            memory_report(workers)
+            report_at = None
+        time.sleep(0.5)
+
+    print("👋 All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
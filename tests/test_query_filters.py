@@ -0,0 +1,74 @@
+import pytest
+
+from query_filters import extract_filters, match_keywords, parse_durations
+
+
+def active(filters):
+    return {key: value for key, value in filters.items() if value}
+
+
+# === Durations ===
+@pytest.mark.parametrize("text, expected", [
+    ("test should take 40 minutes", {"max_duration": 40}),
+    ("1 hour", {"max_duration": 60}),
+    ("1.5 hrs", {"max_duration": 90}),
+    ("2h", {"max_duration": 120}),
+    ("half an hour", {"max_duration": 30}),
+    ("an hour", {"max_duration": 60}),
+    ("one hour", {"max_duration": 60}),
+    ("30-40 mins", {"min_duration": 30, "max_duration": 40}),
+    ("between 20 and 30 minutes", {"min_duration": 20, "max_duration": 30}),
+    ("under 45 min", {"max_duration": 45}),
+    ("at least 20 minutes", {"min_duration": 20}),
+    ("1 hour 30 minutes", {"max_duration": 90}),
+    ("a 40 min test", {"max_duration": 40}),
+])
+def test_parse_durations(text, expected):
+    assert parse_durations(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "Amin is hiring a Java developer",
+    "ah, need a sales test",
+    "one h",
+    "big data hours of experience",
+    "a minimum of experience",
+])
+def test_word_amounts_need_a_spelled_out_unit(text):
+    assert parse_durations(text) == {}
+
+
+# === Keywords ===
+@pytest.mark.parametrize("text", [
+    "an adaptive analyst who can exercise judgement and work remotely, fluent English",
+    "polish the front-end UI",
+    "collaborative behaviour and core competencies",
+    "management experience",
+])
+def test_job_description_vocabulary_is_not_a_filter(text):
+    assert active(extract_filters(text)) == {}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("knowledge test in English", {"test_types": ["Knowledge & Skills"], "languages": ["english"]}),
+    ("Spanish version of the sales test", {"languages": ["spanish"]}),
+    ("test in Polish", {"languages": ["polish"]}),
+    ("Mandarin speaking agents", {"languages": ["chinese"]}),
+    ("computer adaptive ability test", {"test_types": ["Ability & Aptitude"], "adaptive": True}),
+    ("adaptive testing", {"adaptive": True}),
+    ("can be tested remotely", {"remote": True}),
+    ("in-tray exercise for managers", {"job_levels": ["manager"], "test_types": ["Assessment Exercises"]}),
+    ("behavioural assessment", {"test_types": ["Personality & Behavior"]}),
+    ("situational judgement test", {"test_types": ["Biodata & Situational Judgement"]}),
+    ("Java developers, 40 minutes", {"max_duration": 40}),
+])
+def test_extract_filters(text, expected):
+    assert active(extract_filters(text)) == expected
+
+
+def test_longest_phrase_wins_and_contained_matches_are_skipped():
+    assert match_keywords("mid senior developer")["job_levels"] == ["mid"]
+    assert match_keywords("senior developer")["job_levels"] == ["mid", "professional"]
+    assert match_keywords("simulations for managers") == {
+        "job_levels": ["manager"], "test_types": ["Simulations"], "flags": [], "languages": []
+    }
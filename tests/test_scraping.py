@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from scraping import CatalogScraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "shl_catalog")
+LIST_PATH = "/solutions/products/product-catalog/"
+DETAIL_PREFIX = "/solutions/products/product-catalog/view/"
+LAST_MODIFIED = "Tue, 01 Oct 2024 08:00:00 GMT"
+
+
+# === Fixture server ===
+# Serves the saved catalog pages with an ETag per file and answers matching
+# If-None-Match requests with 304. Every request is recorded as
+# (path, If-None-Match); paths in server.missing return 404.
+class CatalogHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        validator = self.headers.get("If-None-Match")
+        self.server.requests.append((url.path, validator))
+
+        if url.path == LIST_PATH:
+            name = f"list_start_{parse_qs(url.query).get('start', ['0'])[0]}.html"
+        elif url.path.startswith(DETAIL_PREFIX):
+            name = f"detail_{url.path[len(DETAIL_PREFIX):].strip('/')}.html"
+        else:
+            name = None
+        path = os.path.join(FIXTURES_DIR, name) if name else None
+        if path is None or url.path in self.server.missing or not os.path.exists(path):
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        with open(path, "rb") as f:
+            body = f.read()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if validator == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), CatalogHandler)
+    httpd.requests = []
+    httpd.missing = set()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def make_scraper(server, tmp_path):
+    def make():
+        return CatalogScraper(f"http://127.0.0.1:{server.server_port}", workers=4, rate_per_host=0,
+                              checkpoint_path=str(tmp_path / "checkpoint.jsonl"),
+                              http_cache_path=str(tmp_path / "http_cache.json"))
+    return make
+
+
+def detail_requests(server):
+    return [(path, validator) for path, validator in server.requests if path.startswith(DETAIL_PREFIX)]
+
+
+# === Tests ===
+def test_crawl_parses_list_and_detail_pages(server, make_scraper, tmp_path):
+    scraper = make_scraper()
+    rows = scraper.scrape_category()
+
+    assert [r["Assessment Name"] for r in rows] == [
+        "Java 8 (New)", "SQL Server (New)", "Motivation Questionnaire MQM5"
+    ]
+    java = rows[0]
+    assert java["URL"] == f"http://127.0.0.1:{server.server_port}{DETAIL_PREFIX}java-8-new/"
+    assert java["Remote Testing Support"] == "Yes"
+    assert java["Adaptive Support"] == "No"
+    assert java["Test Type(s)"] == "K, A, B, C, D, E, K, P, S"
+    assert java["Duration"] == "18"
+    assert java["Job Levels"] == "Mid-Professional, Professional Individual Contributor,"
+    assert rows[2]["Duration"] == "Untimed, approx. 25"
+    assert scraper.stats == {"fetched": 3, "not_modified": 0, "resumed": 0, "failed": 0}
+
+    with open(tmp_path / "checkpoint.jsonl", encoding="utf-8") as f:
+        assert len(f.readlines()) == 3
+
+
+def test_interrupted_crawl_resumes_from_checkpoint(server, make_scraper):
+    failing = f"{DETAIL_PREFIX}sql-server-new/"
+    server.missing.add(failing)
+    first = make_scraper()
+    rows = first.scrape_category()
+    assert first.stats["failed"] == 1
+    assert rows[1]["Description"] == "N/A"
+
+    server.missing.clear()
+    server.requests.clear()
+    second = make_scraper()
+    rows = second.scrape_category()
+
+    # Only the failed row is fetched again; the checkpointed ones are reused
+    assert [path for path, _ in detail_requests(server)] == [failing]
+    assert second.stats["resumed"] == 2
+    assert second.stats["failed"] == 0
+    assert [r["Duration"] for r in rows] == ["18", "11", "Untimed, approx. 25"]
+
+
+def test_unchanged_detail_pages_are_not_refetched(server, make_scraper, tmp_path):
+    first = make_scraper()
+    rows = first.scrape_category()
+    first.finish()
+    assert not os.path.exists(tmp_path / "checkpoint.jsonl")
+
+    with open(tmp_path / "http_cache.json", encoding="utf-8") as f:
+        http_cache = json.load(f)
+    assert all(entry["etag"] and entry["last_modified"] == LAST_MODIFIED for entry in http_cache.values())
+
+    server.requests.clear()
+    second = make_scraper()
+    assert second.scrape_category() == rows
+    assert second.stats == {"fetched": 0, "not_modified": 3, "resumed": 0, "failed": 0}
+    assert all(validator == http_cache[f"http://127.0.0.1:{server.server_port}{path}"]["etag"]
+               for path, validator in detail_requests(server))